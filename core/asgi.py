@@ -3,6 +3,10 @@ ASGI config for core project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve through this module (e.g. ``gunicorn core.asgi:application -k
+uvicorn.workers.UvicornWorker``) to keep /api/chat/stream/ connections open;
+under WSGI that endpoint degrades to one long-poll per connection.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -1,15 +1,86 @@
 from django.contrib import admin
 from .models import Product, Order, OrderItem, CartItem, ShippingAddress, ChatMessage, User, ChatThread, Message
+from .pagination import EstimatedCountPaginator
 
-class OrderAdmin(admin.ModelAdmin):
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist defaults for tables too big to COUNT(*) or render FK dropdowns for."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+
+class ProductAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'brand', 'category', 'price', 'discount', 'quantity', 'sku']
+    list_filter = ['category', 'brand']
+    search_fields = ['name', '=sku']
+
+
+class UserAdmin(admin.ModelAdmin):
+    list_display = ['id', 'email', 'full_name', 'is_active', 'is_staff']
+    list_filter = ['is_active', 'is_staff']
+    search_fields = ['^email', 'full_name']
+    ordering = ['id']
+
+
+class OrderAdmin(LargeTableAdmin):
     list_display = ['id', 'user', 'total_price', 'order_status', 'payment_status', 'created_at']
+    list_select_related = ['user']
+    list_filter = ['order_status', 'payment_status', 'created_at']
+    search_fields = ['=id', '^user__email']
+    raw_id_fields = ['user']
+    ordering = ['-created_at', '-id']
+
+
+class OrderItemAdmin(LargeTableAdmin):
+    list_display = ['id', 'order', 'product', 'quantity', 'price']
+    # Order.__str__ shows the customer's email.
+    list_select_related = ['order__user', 'product']
+    search_fields = ['=order__id']
+    raw_id_fields = ['order', 'product']
+    ordering = ['-id']
+
+
+class CartItemAdmin(LargeTableAdmin):
+    list_display = ['id', 'user', 'product', 'quantity', 'created_at']
+    list_select_related = ['user', 'product']
+    search_fields = ['^user__email']
+    autocomplete_fields = ['user', 'product']
+    ordering = ['-id']
+
+
+class ChatMessageAdmin(LargeTableAdmin):
+    list_display = ['id', 'sender', 'recipient', 'short_message', 'timestamp']
+    list_select_related = ['sender', 'recipient']
+    search_fields = ['^sender__email', '^recipient__email']
+    autocomplete_fields = ['sender', 'recipient']
+    ordering = ['-id']
+
+    @admin.display(description='message')
+    def short_message(self, obj):
+        return obj.message[:60]
+
+
+class MessageAdmin(LargeTableAdmin):
+    list_display = ['id', 'thread', 'sender', 'short_text', 'timestamp']
+    # ChatThread.__str__ shows the customer's email.
+    list_select_related = ['thread__customer', 'sender']
+    search_fields = ['^sender__email']
+    raw_id_fields = ['thread']
+    autocomplete_fields = ['sender']
+    ordering = ['-id']
+
+    @admin.display(description='text')
+    def short_text(self, obj):
+        return obj.text[:60]
+
 
-admin.site.register(Product)
+admin.site.register(Product, ProductAdmin)
 admin.site.register(Order, OrderAdmin)
-admin.site.register(OrderItem)
-admin.site.register(CartItem)
+admin.site.register(OrderItem, OrderItemAdmin)
+admin.site.register(CartItem, CartItemAdmin)
 admin.site.register(ShippingAddress)
-admin.site.register(ChatMessage)
-admin.site.register(User)
+admin.site.register(ChatMessage, ChatMessageAdmin)
+admin.site.register(User, UserAdmin)
 admin.site.register(ChatThread)
-admin.site.register(Message)
+admin.site.register(Message, MessageAdmin)
@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .caching import bump_version, get_version
+
+AUTH_USER_CACHE_TIMEOUT = getattr(settings, "AUTH_USER_CACHE_TIMEOUT", 60)
+
+
+def user_version_key(user_id):
+    return "auth:user:%s:version" % user_id
+
+
+def get_user_version(user_id):
+    return get_version(user_version_key(user_id))
+
+
+def invalidate_cached_user(user_id):
+    """Drop every cached copy of this user, in all processes sharing the cache."""
+    bump_version(user_version_key(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves the user from the cache.
+
+    Users are stored for AUTH_USER_CACHE_TIMEOUT seconds under a per-user
+    version, which is bumped whenever the User row is saved or deleted
+    (see shop.signals), so blocking a user or changing their password
+    takes effect on their next request.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        key = "auth:user:%s:%s" % (user_id, get_user_version(user_id))
+        user = cache.get(key)
+        if user is None:
+            try:
+                user = self.user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            cache.set(key, user, AUTH_USER_CACHE_TIMEOUT)
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
@@ -0,0 +1,207 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+from .db_router import pin_to_primary
+
+CATALOG_VERSION_KEY = "catalog:version"
+CATALOG_MODIFIED_KEY = "catalog:modified"
+PRODUCT_VERSION_KEY = "catalog:product:%s"
+ORDERS_VERSION_KEY = "orders:version"
+CATALOG_CACHE_TIMEOUT = getattr(settings, "CATALOG_CACHE_TIMEOUT", 60 * 60)
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock rather than 1 so a cache restart can never hand
+        # out a version (and therefore an ETag) a client has already seen.
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        get_version(key)
+        cache.incr(key)
+
+
+def get_catalog_version():
+    return get_version(CATALOG_VERSION_KEY)
+
+
+def get_catalog_modified():
+    """When the catalog last changed, as a Unix timestamp."""
+    modified = cache.get(CATALOG_MODIFIED_KEY)
+    if modified is None:
+        # Unknown (cache restart): claim "just now" so clients refetch.
+        cache.add(CATALOG_MODIFIED_KEY, time.time(), timeout=None)
+        modified = cache.get(CATALOG_MODIFIED_KEY)
+    return modified
+
+
+def bump_catalog_version():
+    """Invalidate every cached catalog response at once."""
+    bump_version(CATALOG_VERSION_KEY)
+    cache.set(CATALOG_MODIFIED_KEY, time.time(), timeout=None)
+
+
+def get_product_version(pk):
+    """
+    Version of one product's stock, for responses about that product alone.
+    None for a pk that is not an integer (the view will 404 anyway).
+    """
+    try:
+        key = PRODUCT_VERSION_KEY % int(pk)
+    except (TypeError, ValueError):
+        return None
+    return get_version(key)
+
+
+def bump_product_versions(pks):
+    """Invalidate cached responses about these products only (checkout stock changes)."""
+    for pk in pks:
+        try:
+            cache.incr(PRODUCT_VERSION_KEY % pk)
+        except ValueError:
+            # Never read since the cache started: nothing cached to drop.
+            pass
+
+
+def get_orders_version():
+    """
+    Bumped by every order, order line and user change (see shop.signals),
+    for order lists too broad to validate from the rows themselves.
+    """
+    return get_version(ORDERS_VERSION_KEY)
+
+
+def bump_orders_version():
+    bump_version(ORDERS_VERSION_KEY)
+
+
+def response_etag(request, *parts):
+    """ETag for ``parts`` as rendered for this URL and format."""
+    renderer = getattr(request, "accepted_renderer", None)
+    parts = [str(part) for part in parts] + [
+        request.get_host(),
+        request.get_full_path(),
+        getattr(renderer, "format", ""),
+    ]
+    return '"%s"' % hashlib.sha1("|".join(parts).encode()).hexdigest()
+
+
+def catalog_etag(request, *versions):
+    return response_etag(request, *versions)
+
+
+def last_modified_header(timestamp):
+    """
+    HTTP date for ``timestamp``, or None while its second is still running:
+    Last-Modified only has whole seconds, so a later change in the same
+    second would otherwise look unmodified to If-Modified-Since.
+    """
+    if timestamp is None or int(timestamp) >= int(time.time()):
+        return None
+    return http_date(int(timestamp))
+
+
+def not_modified(request, etag, last_modified=None):
+    """
+    Whether the request's validators still match. If-None-Match is compared
+    weakly (compression makes ETags weak) and, when present, decides alone.
+    """
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match is not None:
+        etags = {tag[2:] if tag.startswith("W/") else tag for tag in parse_etags(if_none_match)}
+        return "*" in etags or etag in etags
+    if_modified_since = parse_http_date_safe(request.headers.get("If-Modified-Since", ""))
+    return (
+        last_modified is not None
+        and if_modified_since is not None
+        and last_modified_header(last_modified) is not None
+        and int(last_modified) <= if_modified_since
+    )
+
+
+def validator_headers(etag, last_modified=None):
+    headers = {"ETag": etag}
+    header = last_modified_header(last_modified)
+    if header:
+        headers["Last-Modified"] = header
+    return headers
+
+
+def conditional_response(request, build_response, parts):
+    """
+    Per-user reads revalidated against cheap validators instead of cached.
+
+    ``parts`` (plus the user and URL) make the ETag; a request that already
+    has it gets a 304 without ``build_response`` running. Responses are
+    marked private and must-revalidate, since they depend on who is asking.
+    """
+    user = getattr(request, "user", None)
+    etag = response_etag(request, getattr(user, "pk", None), *parts)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if not_modified(request, etag):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response = build_response()
+    if response.status_code == status.HTTP_200_OK:
+        for name, value in headers.items():
+            response[name] = value
+    return response
+
+
+def cached_catalog_response(request, build_response, *versions):
+    """
+    Serve a catalog read from the versioned cache.
+
+    ``build_response`` is only called on a miss. A request whose
+    If-None-Match carries the current ETag, or whose If-Modified-Since is
+    no older than the last catalog change, gets a 304 without any query.
+    Extra ``versions`` (``get_product_version``) key the entry further; such
+    responses carry no Last-Modified, as those versions are not timestamps.
+    """
+    if request.method not in ("GET", "HEAD"):
+        return build_response()
+
+    version = get_catalog_version()
+    etag = catalog_etag(request, version, *versions)
+    modified = None if versions else get_catalog_modified()
+    headers = validator_headers(etag, modified)
+    if not_modified(request, etag, modified):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    key = "catalog:%s:%s" % (version, etag.strip('"'))
+    data = cache.get(key)
+    if data is None:
+        # The entry outlives replica lag: built from a replica that has not
+        # caught up with the write behind the new version, it would serve the
+        # old rows for the whole timeout.
+        pin_to_primary()
+        response = build_response()
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        cache.set(key, response.data, CATALOG_CACHE_TIMEOUT)
+    else:
+        response = Response(data)
+    for name, value in headers.items():
+        response[name] = value
+    return response
+
+
+def catalog_cached(view_func):
+    """Decorator form of ``cached_catalog_response`` for function views."""
+    @wraps(view_func)
+    def wrapped(request, *args, **kwargs):
+        return cached_catalog_response(request, lambda: view_func(request, *args, **kwargs))
+    return wrapped
@@ -0,0 +1,191 @@
+from decimal import Decimal
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import BooleanField, Case, DecimalField, ExpressionWrapper, F, Q, Sum, When, Window
+
+from .checkout import CENT, MAX_PRODUCT_ID, MAX_QUANTITY
+from .images import derivative_url
+from .models import CartItem, Product
+from .serializers import absolute_url
+
+LINE_FIELDS = (
+    'id', 'quantity', 'created_at', 'line_total', 'in_stock', 'cart_total', 'item_count',
+    'product_id', 'product__name', 'product__brand', 'product__category', 'product__image',
+    'product__price', 'product__discount', 'product__effective_price', 'product__quantity',
+    'product__image_derivatives',
+)
+
+
+OPERATIONS = ('add', 'set', 'remove')
+
+
+class CartError(Exception):
+    pass
+
+
+def normalize_operations(operations):
+    """
+    Collapse a list of add/set/remove operations into one change per product.
+
+    Returns ``(adds, sets, removes)``: ``{product_id: increment}``,
+    ``{product_id: quantity}`` and a set of product ids. Operations apply in
+    order, so ``set 2`` then ``add 1`` is ``set 3`` and ``remove`` then
+    ``add 1`` is ``set 1``.
+    """
+    if not isinstance(operations, list) or not operations:
+        raise CartError('Provide a non-empty list of operations.')
+    final = {}
+    for operation in operations:
+        try:
+            op = operation['op']
+            product_id = int(operation['product'])
+            quantity = int(operation.get('quantity', 1)) if op != 'remove' else 0
+        except (KeyError, TypeError, ValueError, AttributeError):
+            raise CartError('Each operation needs an op, a product id and a whole-number quantity.')
+        if op not in OPERATIONS:
+            raise CartError(f'Unknown operation {op!r}; expected one of {", ".join(OPERATIONS)}.')
+        if not 1 <= product_id <= MAX_PRODUCT_ID:
+            raise CartError(f'Product not found: {product_id}.')
+        if not 0 <= quantity <= MAX_QUANTITY or (op == 'add' and quantity == 0):
+            raise CartError(f'Invalid quantity for product {product_id}.')
+
+        kind, current = final.get(product_id, ('add', 0))
+        if op == 'remove':
+            final[product_id] = ('remove', 0)
+        elif op == 'set':
+            final[product_id] = ('set', quantity)
+        elif kind == 'remove':
+            final[product_id] = ('set', quantity)
+        else:
+            final[product_id] = (kind, current + quantity)
+        if final[product_id][1] > MAX_QUANTITY:
+            raise CartError(f'Invalid quantity for product {product_id}.')
+
+    adds, sets, removes = {}, {}, set()
+    for product_id, (kind, quantity) in final.items():
+        if kind == 'add':
+            adds[product_id] = quantity
+        elif kind == 'set' and quantity > 0:
+            sets[product_id] = quantity
+        else:
+            removes.add(product_id)
+    return adds, sets, removes
+
+
+def add_items(user, increments):
+    """
+    Add ``{product_id: quantity}`` to the cart without a read-modify-write.
+
+    Missing rows are inserted at zero (conflicts ignored thanks to the
+    (user, product) unique constraint), then every row is incremented with
+    one ``quantity = quantity + CASE ...`` UPDATE, so concurrent adds of the
+    same product never lose an increment.
+
+    Raises CartError, leaving the rows to the caller's transaction to roll
+    back, if a line would end up above MAX_QUANTITY.
+    """
+    if not increments:
+        return
+    CartItem.objects.bulk_create(
+        [CartItem(user=user, product_id=product_id, quantity=0) for product_id in increments],
+        ignore_conflicts=True,
+    )
+    fits = Q()
+    for product_id, quantity in increments.items():
+        fits |= Q(product_id=product_id, quantity__lte=MAX_QUANTITY - quantity)
+    updated = CartItem.objects.filter(fits, user=user).update(
+        quantity=Case(*[
+            When(product_id=product_id, then=F('quantity') + quantity)
+            for product_id, quantity in increments.items()
+        ])
+    )
+    if updated != len(increments):
+        raise CartError(f'A cart line holds at most {MAX_QUANTITY} items.')
+
+
+def apply_operations(user, operations):
+    """Apply a batch of cart operations in one transaction."""
+    adds, sets, removes = normalize_operations(operations)
+    wanted = set(adds) | set(sets)
+    known = set(Product.objects.filter(pk__in=wanted).values_list('pk', flat=True))
+    missing = sorted(wanted - known)
+    if missing:
+        raise CartError(f'Product not found: {", ".join(map(str, missing))}.')
+
+    with transaction.atomic():
+        if removes:
+            CartItem.objects.filter(user=user, product_id__in=removes).delete()
+        if sets:
+            CartItem.objects.bulk_create(
+                [CartItem(user=user, product_id=product_id, quantity=quantity) for product_id, quantity in sets.items()],
+                update_conflicts=True,
+                unique_fields=['user', 'product'],
+                update_fields=['quantity'],
+            )
+        add_items(user, adds)
+
+
+def money(value):
+    """Decimal as a two-place string, like DRF's DecimalField renders it."""
+    return str((value or Decimal('0')).quantize(CENT))
+
+
+def summary_rows(user):
+    """
+    Cart lines joined with their product, in one query.
+
+    Line totals, stock checks and the cart-wide totals are all computed by
+    the database; the totals ride along on every row as window aggregates.
+    """
+    line_total = ExpressionWrapper(
+        F('quantity') * F('product__effective_price'),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
+    return (
+        CartItem.objects.filter(user=user)
+        .annotate(
+            line_total=line_total,
+            in_stock=ExpressionWrapper(Q(quantity__lte=F('product__quantity')), output_field=BooleanField()),
+            cart_total=Window(Sum(line_total)),
+            item_count=Window(Sum('quantity')),
+        )
+        .order_by('created_at', 'id')
+        .values(*LINE_FIELDS)
+    )
+
+
+def cart_summary(user, request=None):
+    lines = []
+    total, item_count = None, 0
+    for row in summary_rows(user):
+        total, item_count = row['cart_total'], row['item_count']
+        image = row['product__image']
+        lines.append({
+            'id': row['id'],
+            'quantity': row['quantity'],
+            'line_total': money(row['line_total']),
+            'in_stock': row['in_stock'],
+            'product': {
+                'id': row['product_id'],
+                'name': row['product__name'],
+                'brand': row['product__brand'],
+                'category': row['product__category'],
+                'image': absolute_url(request, default_storage.url(image)) if image else None,
+                'thumbnail': (
+                    absolute_url(request, derivative_url(image, row['product__image_derivatives'], 'thumbnail'))
+                    if image else None
+                ),
+                'price': money(row['product__price']),
+                'discount': row['product__discount'],
+                'effective_price': money(row['product__effective_price']),
+                'stock': row['product__quantity'],
+            },
+        })
+    return {
+        'items': lines,
+        'line_count': len(lines),
+        'item_count': item_count,
+        'total': money(total),
+        'all_in_stock': all(line['in_stock'] for line in lines),
+    }
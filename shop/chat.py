@@ -0,0 +1,225 @@
+import asyncio
+import json
+import threading
+import time
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, models
+from django.utils.module_loading import import_string
+
+from .models import ChatMessage
+from .serializers import ChatMessageSerializer
+
+# Upper bound for one long-poll or one idle SSE wait, in seconds.
+MAX_WAIT = 25
+BATCH_SIZE = 200
+# Largest id the database can hold; bigger cursors are rejected up front.
+MAX_ID = 2 ** 63 - 1
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+class Subscription:
+    """
+    A wake-up flag for one channel.
+
+    It only says "something changed"; the messages themselves are always
+    read from the database with a ``since_id`` cursor, so a wake-up that
+    arrives while nobody is waiting is never lost, just coalesced.
+    """
+
+    def __init__(self, broker, channel):
+        self.broker = broker
+        self.channel = channel
+        self._event = threading.Event()
+        try:
+            self._loop = asyncio.get_running_loop()
+            self._async_event = asyncio.Event()
+        except RuntimeError:
+            self._loop = None
+            self._async_event = None
+
+    def notify(self):
+        self._event.set()
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._async_event.set)
+
+    def wait(self, timeout):
+        woke = self._event.wait(timeout)
+        self._event.clear()
+        return woke
+
+    async def wait_async(self, timeout):
+        try:
+            await asyncio.wait_for(self._async_event.wait(), timeout)
+            woke = True
+        except asyncio.TimeoutError:
+            woke = False
+        self._async_event.clear()
+        self._event.clear()
+        return woke
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class InProcessBroker:
+    """Fan-out between requests served by the same process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel)
+        with self._lock:
+            self._subscriptions[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscriptions.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscriptions[subscription.channel]
+
+    def publish(self, channel):
+        with self._lock:
+            subscribers = list(self._subscriptions.get(channel, ()))
+        for subscription in subscribers:
+            subscription.notify()
+
+
+class DatabasePollBroker(InProcessBroker):
+    """
+    Stand-in broker for multi-worker runs without an external message bus.
+
+    One background thread per process tails ``ChatMessage`` by id and wakes
+    local subscribers, so a message written by another worker is delivered
+    within ``CHAT_BROKER_POLL_INTERVAL`` seconds at the cost of one indexed
+    query per interval per process, not per open chat screen.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.interval = getattr(settings, 'CHAT_BROKER_POLL_INTERVAL', 0.5)
+        self._last_id = None
+        self._thread = None
+
+    def subscribe(self, channel):
+        self._ensure_thread()
+        return super().subscribe(channel)
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='chat-broker', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self._poll()
+            except Exception:
+                close_old_connections()
+            time.sleep(self.interval)
+
+    def _poll(self):
+        if self._last_id is None:
+            self._last_id = ChatMessage.objects.aggregate(last=models.Max('id'))['last'] or 0
+            return
+        rows = list(
+            ChatMessage.objects.filter(id__gt=self._last_id)
+            .order_by('id').values_list('id', 'sender_id', 'recipient_id')
+        )
+        for message_id, sender_id, recipient_id in rows:
+            self._last_id = message_id
+            self.publish(user_channel(sender_id))
+            self.publish(user_channel(recipient_id))
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                path = getattr(settings, 'CHAT_BROKER', 'shop.chat.InProcessBroker')
+                _broker = import_string(path)()
+    return _broker
+
+
+def publish_message(message):
+    broker = get_broker()
+    broker.publish(user_channel(message.recipient_id))
+    broker.publish(user_channel(message.sender_id))
+
+
+def messages_since(user, since_id, other_user_id=None):
+    """Serialized messages to or from ``user`` with ``id > since_id``, oldest first."""
+    queryset = ChatMessage.objects.filter(id__gt=since_id)
+    if other_user_id:
+        queryset = queryset.filter(
+            models.Q(sender=user, recipient_id=other_user_id) |
+            models.Q(sender_id=other_user_id, recipient=user)
+        )
+    else:
+        queryset = queryset.filter(models.Q(sender=user) | models.Q(recipient=user))
+    queryset = queryset.select_related('sender', 'recipient').order_by('id')[:BATCH_SIZE]
+    return ChatMessageSerializer(queryset, many=True).data
+
+
+def wait_for_messages(user, since_id, timeout, other_user_id=None):
+    """Long-poll: return new messages at once, or block until some arrive or ``timeout``."""
+    with get_broker().subscribe(user_channel(user.id)) as subscription:
+        deadline = time.monotonic() + timeout
+        while True:
+            messages = messages_since(user, since_id, other_user_id)
+            remaining = deadline - time.monotonic()
+            if messages or remaining <= 0:
+                return messages
+            subscription.wait(remaining)
+
+
+def sse_event(message):
+    payload = json.dumps(message, default=str)
+    return f"id: {message['id']}\nevent: message\ndata: {payload}\n\n"
+
+
+async def event_stream(user, since_id, other_user_id=None):
+    """Server-sent events for ``user``; ``id:`` lets EventSource resume via Last-Event-ID."""
+    fetch = sync_to_async(messages_since)
+    subscription = get_broker().subscribe(user_channel(user.id))
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            messages = await fetch(user, since_id, other_user_id)
+            for message in messages:
+                since_id = message['id']
+                yield sse_event(message)
+            if len(messages) < BATCH_SIZE:
+                if not await subscription.wait_async(MAX_WAIT):
+                    yield ": keep-alive\n\n"
+    finally:
+        subscription.close()
+
+
+def finite_event_stream(user, since_id, other_user_id=None):
+    """WSGI fallback: one long-poll worth of events, then EventSource reconnects."""
+    yield "retry: 1000\n\n"
+    for message in wait_for_messages(user, since_id, MAX_WAIT, other_user_id):
+        yield sse_event(message)
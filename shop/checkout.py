@@ -0,0 +1,112 @@
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, F, Q, When
+
+from .caching import bump_catalog_version, bump_product_versions
+from .models import CartItem, Order, OrderItem, Product
+from . import sales
+
+CENT = Decimal('0.01')
+
+# Column ranges (BigAutoField ids, PositiveIntegerField quantities): larger
+# values would overflow in the database instead of failing validation.
+MAX_PRODUCT_ID = 2 ** 63 - 1
+MAX_QUANTITY = 2 ** 31 - 1
+
+
+class CheckoutError(Exception):
+    pass
+
+
+def normalize_items(items):
+    """Merge request lines into ``{product_id: quantity}``, rejecting bad input."""
+    if not isinstance(items, list):
+        raise CheckoutError('items must be a list.')
+    quantities = OrderedDict()
+    for item in items:
+        try:
+            product_id = int(item['product'])
+            quantity = int(item['quantity'])
+        except (KeyError, TypeError, ValueError):
+            raise CheckoutError('Each item needs a product id and a quantity.')
+        if not 1 <= product_id <= MAX_PRODUCT_ID:
+            raise CheckoutError(f'Product not found: {product_id}.')
+        if not 1 <= quantity <= MAX_QUANTITY:
+            raise CheckoutError(f'Invalid quantity for product {product_id}.')
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+        if quantities[product_id] > MAX_QUANTITY:
+            raise CheckoutError(f'Invalid quantity for product {product_id}.')
+    if not quantities:
+        raise CheckoutError('Order has no items.')
+    return quantities
+
+
+def reserve_stock(quantities):
+    """Decrement stock for every line in one conditional UPDATE.
+
+    Rows without enough stock are left out by the WHERE clause, so a short
+    row count means at least one line cannot be fulfilled.
+    """
+    enough_stock = Q()
+    new_quantity = []
+    for product_id, quantity in quantities.items():
+        enough_stock |= Q(pk=product_id, quantity__gte=quantity)
+        new_quantity.append(When(pk=product_id, then=F('quantity') - quantity))
+    updated = Product.objects.filter(enough_stock).update(quantity=Case(*new_quantity))
+    return updated == len(quantities)
+
+
+def place_order(user, items, payment_method='COD'):
+    """
+    Create an order for ``items`` as a single unit of work.
+
+    Prices come from ``Product.effective_price``, the same column the
+    catalog sorts and filters on; anything the client sent is ignored. The
+    order, its lines, the stock decrement, the sales rollups and the removal
+    of the ordered products from the cart commit or roll back together, in a
+    fixed number of queries regardless of cart size.
+    """
+    quantities = normalize_items(items)
+
+    with transaction.atomic():
+        products = Product.objects.in_bulk(list(quantities))
+        missing = [pk for pk in quantities if pk not in products]
+        if missing:
+            raise CheckoutError(f'Product not found: {", ".join(map(str, missing))}.')
+
+        lines = []
+        total = Decimal('0')
+        for product_id, quantity in quantities.items():
+            price = products[product_id].effective_price
+            total += price * quantity
+            lines.append(OrderItem(product_id=product_id, quantity=quantity, price=price))
+
+        if not reserve_stock(quantities):
+            raise CheckoutError('Not enough stock for one or more items.')
+
+        order = Order.objects.create(
+            user=user,
+            total_price=total.quantize(CENT),
+            payment_method=payment_method,
+            payment_status='pending',
+            order_status='pending',
+        )
+        for line in lines:
+            line.order = order
+        # bulk_create sends no signals; the order itself was counted by
+        # shop.signals when it was created.
+        OrderItem.objects.bulk_create(lines)
+        sales.apply_lines(order, lines)
+
+        CartItem.objects.filter(user=user, product_id__in=list(quantities)).delete()
+
+        # update() sends no signals. Only these products' detail responses
+        # carry exact stock; lists keep their counts (checkout re-checks
+        # stock anyway) until a product sells out and leaves the offer.
+        transaction.on_commit(lambda: bump_product_versions(quantities))
+        if any(products[pk].quantity <= quantity for pk, quantity in quantities.items()):
+            transaction.on_commit(bump_catalog_version)
+
+    return order
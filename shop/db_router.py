@@ -0,0 +1,60 @@
+import contextvars
+
+from django.conf import settings
+from django.db import connections
+
+PRIMARY = 'default'
+REPLICA = 'replica'
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_pinned = contextvars.ContextVar('pinned_to_primary', default=False)
+
+
+def pin_to_primary():
+    _pinned.set(True)
+
+
+class PrimaryReplicaRouter:
+    """
+    Send catalog, review and dashboard rollup reads to the ``replica`` alias.
+
+    Everything else (orders, cart, chat, users, notifications) and every write
+    goes to the primary. Once a request has written anything, or if it is
+    not a safe method, all its reads are pinned to the primary so it reads
+    its own writes. Without a ``replica`` alias this router is a no-op.
+    """
+
+    replica_models = {'shop.product', 'shop.review', 'shop.productsales', 'shop.dailysales'}
+
+    def db_for_read(self, model, **hints):
+        if REPLICA not in settings.DATABASES:
+            return None
+        if _pinned.get() or connections[PRIMARY].in_atomic_block:
+            return PRIMARY
+        if model._meta.label_lower in self.replica_models:
+            return REPLICA
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        pin_to_primary()
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if {obj1._state.db, obj2._state.db} <= {PRIMARY, REPLICA}:
+            return True
+        return None
+
+
+class ReplicaPinningMiddleware:
+    """Scope read-your-writes pinning to a single request."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _pinned.set(request.method not in SAFE_METHODS)
+        try:
+            return self.get_response(request)
+        finally:
+            _pinned.reset(token)
@@ -0,0 +1,129 @@
+import csv
+import json
+from datetime import datetime, time, timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Order
+
+CHUNK_SIZE = 2000
+
+ORDER_COLUMNS = (
+    ('order_id', 'id'),
+    ('created_at', 'created_at'),
+    ('customer_email', 'user__email'),
+    ('customer_name', 'user__full_name'),
+    ('order_status', 'order_status'),
+    ('payment_status', 'payment_status'),
+    ('payment_method', 'payment_method'),
+    ('total_price', 'total_price'),
+)
+ITEM_COLUMNS = (
+    ('item_id', 'items__id'),
+    ('product_id', 'items__product_id'),
+    ('product_name', 'items__product__name'),
+    ('quantity', 'items__quantity'),
+    ('unit_price', 'items__price'),
+)
+
+
+class ExportError(ValueError):
+    pass
+
+
+def parse_bound(value, name, end=False):
+    """
+    An ISO date or datetime. ``end`` is exclusive, except that a bare date
+    covers that whole day: ``start=2025-01-01&end=2025-01-31`` is January.
+    """
+    if not value:
+        return None
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ExportError(f'{name} must be an ISO date or datetime, got {value!r}.')
+        moment = datetime.combine(day + timedelta(days=1) if end else day, time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def export_queryset(start=None, end=None, statuses=(), payment_statuses=()):
+    """
+    One row per order item (one per order for orders without items), oldest
+    first, as plain values: no model instances are built.
+    """
+    orders = Order.objects.all()
+    start = parse_bound(start, 'start')
+    end = parse_bound(end, 'end', end=True)
+    if start:
+        orders = orders.filter(created_at__gte=start)
+    if end:
+        orders = orders.filter(created_at__lt=end)
+    if statuses:
+        orders = orders.filter(order_status__in=statuses)
+    if payment_statuses:
+        orders = orders.filter(payment_status__in=payment_statuses)
+    fields = [field for _, field in ORDER_COLUMNS + ITEM_COLUMNS]
+    return orders.order_by('created_at', 'id', 'items__id').values_list(*fields)
+
+
+# Spreadsheets evaluate text cells starting with these as formulas.
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def csv_cell(value):
+    """A value as written to CSV: datetimes in ISO format, formula-like text quoted with a leading ``'``."""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_lines(rows):
+    """CSV text, one line at a time; csv.writer writes into a one-line buffer."""
+    class Line:
+        def write(self, value):
+            return value
+
+    writer = csv.writer(Line())
+    yield writer.writerow([name for name, _ in ORDER_COLUMNS + ITEM_COLUMNS])
+    for row in rows:
+        yield writer.writerow([csv_cell(value) for value in row])
+
+
+def ndjson_lines(rows):
+    """One JSON object per order with its items nested; rows arrive grouped by order."""
+    split = len(ORDER_COLUMNS)
+    order_names = [name for name, _ in ORDER_COLUMNS]
+    item_names = [name for name, _ in ITEM_COLUMNS]
+    current = None
+    for row in rows:
+        if current is None or current['order_id'] != row[0]:
+            if current is not None:
+                yield json.dumps(current, cls=DjangoJSONEncoder) + '\n'
+            current = dict(zip(order_names, row[:split]))
+            current['items'] = []
+        if row[split] is not None:
+            current['items'].append(dict(zip(item_names, row[split:])))
+    if current is not None:
+        yield json.dumps(current, cls=DjangoJSONEncoder) + '\n'
+
+
+FORMATS = {
+    'csv': (csv_lines, 'text/csv; charset=utf-8'),
+    'ndjson': (ndjson_lines, 'application/x-ndjson'),
+}
+
+
+def export_orders(fmt='csv', chunk_size=CHUNK_SIZE, **filters):
+    """``(line iterator, content type)`` for streaming an export."""
+    if fmt not in FORMATS:
+        raise ExportError(f'Unknown export format {fmt!r}; expected one of {", ".join(FORMATS)}.')
+    render, content_type = FORMATS[fmt]
+    rows = export_queryset(**filters).iterator(chunk_size=chunk_size)
+    return render(rows), content_type
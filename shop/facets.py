@@ -0,0 +1,71 @@
+from collections import Counter
+
+from django.db.models import BooleanField, Case, Count, IntegerField, Value, When
+
+from .filters import filter_catalog, price_q
+
+# Lower bounds of the price buckets; the last one is open ended.
+PRICE_BUCKETS = (0, 10000, 25000, 50000, 100000)
+
+
+def price_bucket(field='effective_price'):
+    return Case(
+        *[When(**{f'{field}__lt': upper}, then=Value(i)) for i, upper in enumerate(PRICE_BUCKETS[1:])],
+        default=Value(len(PRICE_BUCKETS) - 1),
+        output_field=IntegerField(),
+    )
+
+
+def facet_counts(queryset, criteria):
+    """
+    Category, brand and price bucket counts for a filtered catalog.
+
+    Each facet is counted with every filter applied except its own, so the
+    client can offer "other brands" while a brand is selected. All three
+    come from one GROUP BY over (category, brand, bucket, in price range);
+    the cross-filtering happens on those few grouped rows in Python.
+    """
+    price_filter = price_q(criteria)
+    rows = (
+        filter_catalog(queryset, criteria, facets=False)
+        .order_by()
+        .annotate(
+            bucket=price_bucket(),
+            in_price=Case(When(price_filter, then=Value(True)), default=Value(False), output_field=BooleanField())
+            if price_filter else Value(True, output_field=BooleanField()),
+        )
+        .values('category', 'brand', 'bucket', 'in_price')
+        .annotate(count=Count('id'))
+    )
+
+    categories, brands, buckets = Counter(), Counter(), Counter()
+    total = 0
+    for row in rows:
+        category_ok = not criteria['category'] or row['category'] in criteria['category']
+        brand_ok = not criteria['brand'] or row['brand'] in criteria['brand']
+        if brand_ok and row['in_price']:
+            categories[row['category']] += row['count']
+        if category_ok and row['in_price']:
+            brands[row['brand']] += row['count']
+        if category_ok and brand_ok:
+            buckets[row['bucket']] += row['count']
+            if row['in_price']:
+                total += row['count']
+
+    return {
+        'total': total,
+        'categories': ranked(categories),
+        'brands': ranked(brands),
+        'price': [
+            {
+                'min': lower,
+                'max': PRICE_BUCKETS[i + 1] if i + 1 < len(PRICE_BUCKETS) else None,
+                'count': buckets[i],
+            }
+            for i, lower in enumerate(PRICE_BUCKETS)
+        ],
+    }
+
+
+def ranked(counter):
+    return [{'value': value, 'count': count} for value, count in sorted(counter.items(), key=lambda item: (-item[1], item[0]))]
@@ -0,0 +1,169 @@
+import copy
+
+from django.db.models import Prefetch
+from rest_framework.exceptions import ValidationError
+
+from .filters import list_param
+
+
+class Expansion:
+    """
+    A relation ``?expand=`` can switch between a compact and a nested form.
+
+    ``collapsed``/``expanded`` are field instances (copied per serializer);
+    ``None`` means the field the serializer declares. ``load``/``load_collapsed``
+    are ``select_related`` paths or ``Prefetch`` objects for each form.
+    """
+
+    def __init__(self, collapsed=None, expanded=None, load=(), load_collapsed=()):
+        self.collapsed = collapsed
+        self.expanded = expanded
+        self.load = load
+        self.load_collapsed = load_collapsed
+
+
+class Fieldset:
+    """
+    The ``?fields=`` and ``?expand=`` a request asked for, checked against a serializer.
+
+    Without either parameter the response is unchanged. With them, only the
+    listed fields are rendered (all of them if ``fields`` is absent) and
+    expandable relations render compactly unless named in ``expand``; the
+    queryset is pruned to match via ``prune()``.
+    """
+
+    def __init__(self, serializer_class, fields=None, expand=None):
+        self.serializer_class = serializer_class
+        self.fields = fields
+        self.expand = expand
+
+    @property
+    def sparse(self):
+        return self.fields is not None or self.expand is not None
+
+    @classmethod
+    def from_request(cls, request, serializer_class):
+        params = request.query_params
+        if 'fields' not in params and 'expand' not in params:
+            return cls(serializer_class)
+        available = available_fields(serializer_class)
+        expandable = getattr(serializer_class.Meta, 'expandable', {})
+        errors = {}
+
+        fields = None
+        if 'fields' in params:
+            requested = list_param(request, 'fields')
+            unknown = [name for name in requested if name not in available]
+            if unknown or not requested:
+                errors['fields'] = [f"Unknown field(s): {', '.join(unknown)}." if unknown else 'List at least one field.']
+            # Declared order, so equal selections share lean column plans.
+            fields = tuple(name for name in available if name in requested)
+
+        expand = list_param(request, 'expand')
+        unknown = [name for name in expand if name not in expandable]
+        if unknown:
+            errors['expand'] = [
+                f"Can't expand {', '.join(unknown)}; expandable: {', '.join(expandable) or 'none'}."
+            ]
+        if errors:
+            raise ValidationError(errors)
+        return cls(serializer_class, fields, frozenset(expand))
+
+    def includes(self, name):
+        return self.fields is None or name in self.fields
+
+    def expands(self, name):
+        return name in self.expand
+
+    def prune(self, queryset):
+        """
+        Limit ``queryset`` to the columns and relations the selected fields
+        read. Non-sparse requests get ``queryset`` back untouched.
+        """
+        if not self.sparse:
+            return queryset
+        model = queryset.model
+        expandable = getattr(self.serializer_class.Meta, 'expandable', {})
+        queryset = queryset.select_related(None).prefetch_related(None)
+        columns, prunable = {model._meta.pk.attname}, True
+        for name, field in available_fields(self.serializer_class).items():
+            if not self.includes(name):
+                continue
+            if name in expandable:
+                expansion = expandable[name]
+                for load in (expansion.load if self.expands(name) else expansion.load_collapsed):
+                    if isinstance(load, Prefetch):
+                        queryset = queryset.prefetch_related(copy.copy(load))
+                    else:
+                        queryset = queryset.select_related(load)
+            source = field.source.split('.')[0]
+            model_field = next((f for f in model._meta.concrete_fields if f.name == source), None)
+            if model_field is not None:
+                columns.add(model_field.attname)
+            elif not (name in expandable and model._meta.get_field(source).auto_created):
+                # A method field or property: no telling which columns it reads.
+                prunable = False
+        if prunable:
+            # Ordering and cursor pagination read these off every row.
+            columns.update(name.lstrip('-') for name in getattr(self.serializer_class.Meta, 'always_load', ()))
+            queryset = queryset.only(*columns)
+        return queryset
+
+
+_available = {}
+
+
+def available_fields(serializer_class):
+    """``serializer_class``'s readable fields, by name; built once per class."""
+    if serializer_class not in _available:
+        _available[serializer_class] = {
+            name: field for name, field in serializer_class().fields.items() if not field.write_only
+        }
+    return _available[serializer_class]
+
+
+class SparseFieldsetMixin:
+    """
+    Serializer side of ``Fieldset``: drops unselected fields and swaps
+    expandable relations for their compact or nested form. Only applies to
+    the serializer the fieldset was parsed for, not to nested ones.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fieldset = self.context.get('fieldset')
+        if fieldset is None or not fieldset.sparse or fieldset.serializer_class is not type(self):
+            return fields
+        expandable = getattr(self.Meta, 'expandable', {})
+        selected = {}
+        for name, field in fields.items():
+            if not fieldset.includes(name) and not field.write_only:
+                continue
+            if name in expandable:
+                expansion = expandable[name]
+                replacement = expansion.expanded if fieldset.expands(name) else expansion.collapsed
+                if replacement is not None:
+                    field = copy.deepcopy(replacement)
+            selected[name] = field
+        return selected
+
+
+class SparseFieldsetViewMixin:
+    """Generic-view side: puts the request's ``Fieldset`` in the serializer context and prunes reads."""
+
+    def get_fieldset(self):
+        if not hasattr(self, '_fieldset'):
+            self._fieldset = Fieldset.from_request(self.request, self.get_serializer_class())
+        return self._fieldset
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fieldset'] = self.get_fieldset()
+        return context
+
+    def filter_queryset(self, queryset):
+        # Here rather than get_queryset, which views override without super().
+        queryset = super().filter_queryset(queryset)
+        if self.request.method in ('GET', 'HEAD'):
+            queryset = self.get_fieldset().prune(queryset)
+        return queryset
@@ -0,0 +1,116 @@
+import math
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+
+
+def number_param(request, name, cast):
+    value = request.query_params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        number = cast(value)
+        finite = math.isfinite(number)
+    except (ValueError, InvalidOperation, OverflowError):
+        raise ValidationError({name: f'Expected a number, got {value!r}.'})
+    if not finite:
+        # nan and inf parse, but the database cannot compare against them.
+        raise ValidationError({name: f'Expected a finite number, got {value!r}.'})
+    return number
+
+
+def limit_param(request, default, maximum):
+    """``?limit=`` clamped to 1..``maximum``; 400 when it is not an integer."""
+    limit = number_param(request, 'limit', int)
+    return default if limit is None else max(1, min(limit, maximum))
+
+
+class ProductRatingFilter(BaseFilterBackend):
+    """``?min_rating=4&min_reviews=10`` against the stored aggregates, no join."""
+
+    def filter_queryset(self, request, queryset, view):
+        min_rating = number_param(request, 'min_rating', float)
+        if min_rating is not None:
+            queryset = queryset.filter(rating_avg__gte=min_rating)
+        min_reviews = number_param(request, 'min_reviews', int)
+        if min_reviews is not None:
+            queryset = queryset.filter(rating_count__gte=min_reviews)
+        return queryset
+
+
+class StableOrderingFilter(OrderingFilter):
+    """
+    OrderingFilter that breaks ties on id so pages never overlap, and orders
+    by id when nothing else (?ordering=, search rank) has.
+    """
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering and not {'id', '-id'} & set(ordering):
+            tiebreak = '-id' if ordering[0].startswith('-') else 'id'
+            ordering = [*ordering, tiebreak]
+        return ordering
+
+    def filter_queryset(self, request, queryset, view):
+        queryset = super().filter_queryset(request, queryset, view)
+        return queryset if queryset.ordered else queryset.order_by('id')
+
+
+def list_param(request, name):
+    """Repeated and/or comma separated values: ``?brand=Apple,Samsung&brand=Oppo``."""
+    values = []
+    for raw in request.query_params.getlist(name):
+        for value in raw.split(','):
+            value = value.strip()
+            if value and value not in values:
+                values.append(value)
+    return values
+
+
+def catalog_criteria(request):
+    return {
+        'category': list_param(request, 'category'),
+        'brand': list_param(request, 'brand'),
+        'min_price': number_param(request, 'min_price', Decimal),
+        'max_price': number_param(request, 'max_price', Decimal),
+        'min_discount': number_param(request, 'min_discount', int),
+        'max_discount': number_param(request, 'max_discount', int),
+    }
+
+
+def price_q(criteria, field='effective_price'):
+    q = Q()
+    if criteria['min_price'] is not None:
+        q &= Q(**{f'{field}__gte': criteria['min_price']})
+    if criteria['max_price'] is not None:
+        q &= Q(**{f'{field}__lte': criteria['max_price']})
+    return q
+
+
+def filter_catalog(queryset, criteria, facets=True):
+    """
+    Apply ``criteria`` to a Product queryset.
+
+    With ``facets=False`` only the non-faceted filters (discount) are
+    applied, which is the base set facet counts are computed over.
+    """
+    if criteria['min_discount'] is not None:
+        queryset = queryset.filter(discount__gte=criteria['min_discount'])
+    if criteria['max_discount'] is not None:
+        queryset = queryset.filter(discount__lte=criteria['max_discount'])
+    if not facets:
+        return queryset
+    if criteria['category']:
+        queryset = queryset.filter(category__in=criteria['category'])
+    if criteria['brand']:
+        queryset = queryset.filter(brand__in=criteria['brand'])
+    return queryset.filter(price_q(criteria))
+
+
+class ProductFacetFilter(BaseFilterBackend):
+    """``?category=&brand=&min_price=&max_price=&min_discount=&max_discount=``"""
+
+    def filter_queryset(self, request, queryset, view):
+        return filter_catalog(queryset, catalog_criteria(request))
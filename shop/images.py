@@ -0,0 +1,131 @@
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+from .caching import bump_catalog_version
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+# Longest edge in pixels for each derivative.
+VARIANTS = {
+    'thumbnail': 150,
+    'card': 400,
+    'detail': 1000,
+}
+
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+# Derivative URLs are cached as immutable (shop/middleware.py): use a new
+# directory when changing the sizes or encoder settings above.
+DERIVATIVES_DIR = 'derivatives'
+
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'IMAGE_DERIVATIVE_WORKERS', 2),
+    thread_name_prefix='image-derivatives',
+)
+
+
+def derivative_name(name, variant, ext):
+    """``product_images/foo.png`` -> ``product_images/derivatives/foo_card.webp``."""
+    directory, filename = posixpath.split(name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(directory, DERIVATIVES_DIR, f'{stem}_{variant}.{ext}')
+
+
+def derivative_url(name, ready_for, variant, ext='webp'):
+    """
+    URL of one derivative of ``name``, or of ``name`` itself while its
+    derivatives are not written yet (``ready_for`` is
+    ``Product.image_derivatives``).
+    """
+    if ready_for != name:
+        return default_storage.url(name)
+    return default_storage.url(derivative_name(name, variant, ext))
+
+
+def derivative_urls(name, ready_for):
+    """Storage URLs of every derivative, as ``{variant: {ext: url}}``."""
+    return {
+        variant: {ext: derivative_url(name, ready_for, variant, ext) for ext in FORMATS}
+        for variant in VARIANTS
+    }
+
+
+def flatten_alpha(image):
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def mark_ready(name):
+    """Start advertising the derivatives of ``name`` on the products using it."""
+    if Product.objects.filter(image=name).exclude(image_derivatives=name).update(image_derivatives=name):
+        # update() sends no signals; cached catalog responses have the old URLs.
+        transaction.on_commit(bump_catalog_version)
+
+
+def generate_derivatives(name, force=False):
+    """
+    Write every variant of the stored image ``name``, then mark the products
+    using it ready. Returns the number written.
+    """
+    targets = [
+        (variant, size, ext, derivative_name(name, variant, ext))
+        for variant, size in VARIANTS.items()
+        for ext in FORMATS
+    ]
+    if not force:
+        targets = [t for t in targets if not default_storage.exists(t[3])]
+    if not targets:
+        mark_ready(name)
+        return 0
+
+    with default_storage.open(name, 'rb') as f:
+        source = ImageOps.exif_transpose(Image.open(f))
+        source.load()
+    source = flatten_alpha(source)
+
+    written = 0
+    for variant, size, ext, target in targets:
+        image = source.copy()
+        # Never upscale; thumbnail() keeps the aspect ratio.
+        image.thumbnail((size, size), Image.LANCZOS)
+        buffer = BytesIO()
+        fmt, options = FORMATS[ext]
+        image.save(buffer, fmt, **options)
+        if default_storage.exists(target):
+            default_storage.delete(target)
+        default_storage.save(target, ContentFile(buffer.getvalue()))
+        written += 1
+    mark_ready(name)
+    return written
+
+
+def _generate_logged(name):
+    try:
+        generate_derivatives(name)
+    except Exception:
+        logger.exception('Could not generate derivatives for %s', name)
+    finally:
+        # Pool threads outlive their tasks and are not request threads, so
+        # nothing else would close the connections they opened.
+        connections.close_all()
+
+
+def schedule_derivatives(name):
+    """Queue derivative generation on the shared worker pool."""
+    return _executor.submit(_generate_logged, name)
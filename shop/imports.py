@@ -0,0 +1,183 @@
+import csv
+import json
+import os
+import posixpath
+import time
+from itertools import islice
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from rest_framework import serializers
+
+from .caching import bump_catalog_version
+from .images import schedule_derivatives
+from .models import Product
+from .serializers import ProductImportSerializer
+
+BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+IMAGE_DIR = 'product_images/'
+FORMATS = ('csv', 'ndjson')
+IMPORT_FIELDS = ProductImportSerializer.Meta.fields
+UPDATE_FIELDS = [field for field in IMPORT_FIELDS if field != 'sku']
+
+
+class ProductImportError(ValueError):
+    pass
+
+
+def read_rows(stream, fmt):
+    """Yield ``(line_number, dict)`` from a text stream."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            # Empty cells mean "not given", so updates can leave columns out.
+            yield reader.line_num, {key: value for key, value in row.items() if key and value not in ('', None)}
+    else:
+        for number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                yield number, None
+                continue
+            yield number, row if isinstance(row, dict) else None
+
+
+def format_for(filename, fmt=None):
+    """The explicit ``fmt`` if given, else guessed from the file extension."""
+    if not fmt:
+        ext = os.path.splitext(filename or '')[1].lower()
+        fmt = 'ndjson' if ext in ('.ndjson', '.jsonl') else 'csv'
+    if fmt not in FORMATS:
+        raise ProductImportError(f'Unknown import format {fmt!r}; expected one of {", ".join(FORMATS)}.')
+    return fmt
+
+
+class ProductImporter:
+    """
+    Validate and upsert product rows keyed on ``sku``, one batch at a time.
+
+    Each batch costs one query to load the SKUs that already exist and one
+    ``INSERT ... ON CONFLICT (sku) DO UPDATE`` for the whole batch. Rows
+    for existing SKUs may carry only the columns to change; new SKUs need a
+    full row. Invalid rows are skipped and reported, the rest of the batch
+    goes in.
+
+    ``image`` columns are file paths under ``image_root``; without one they
+    are rejected. Files are copied into the ``product_images/`` storage.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, image_root=None, dry_run=False, progress=None):
+        self.batch_size = batch_size
+        self.image_root = os.path.realpath(image_root) if image_root else None
+        self.dry_run = dry_run
+        self.progress = progress
+        self.stats = {'processed': 0, 'created': 0, 'updated': 0, 'failed': 0}
+        self.errors = []
+        self.started = None
+
+    def run(self, rows):
+        """Import everything, calling ``progress`` after each batch; returns the final report."""
+        for report in self.run_batches(rows):
+            if self.progress and not report.get('done'):
+                self.progress(report)
+        return report
+
+    def run_batches(self, rows):
+        """Generator form of ``run``: yields a report per batch, then the final one."""
+        self.started = time.perf_counter()
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                break
+            self.import_batch(batch)
+            yield self.report()
+        yield self.report(done=True)
+
+    def report(self, done=False):
+        elapsed = time.perf_counter() - self.started
+        report = dict(self.stats, rows_per_second=round(self.stats['processed'] / elapsed) if elapsed else 0)
+        if done:
+            report.update(done=True, errors=sorted(self.errors, key=lambda error: error['line']))
+        return report
+
+    def fail(self, line, errors):
+        self.stats['failed'] += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'errors': errors})
+
+    def import_batch(self, batch):
+        self.stats['processed'] += len(batch)
+        rows = {}
+        for line, row in batch:
+            if row is None:
+                self.fail(line, {'row': ['Not a JSON object.']})
+                continue
+            sku = str(row.get('sku') or '').strip()
+            if not sku:
+                self.fail(line, {'sku': ['This field is required.']})
+                continue
+            # A SKU repeated within a batch: the last row wins.
+            rows[sku] = (line, row)
+
+        existing = {
+            row['sku']: row
+            for row in Product.objects.filter(sku__in=list(rows)).values(*IMPORT_FIELDS)
+        }
+        # Building a ModelSerializer's fields is most of its cost, so each
+        # batch reuses one instance per mode instead of one per row.
+        validators = {partial: ProductImportSerializer(partial=partial) for partial in (False, True)}
+        products, images = [], []
+        for sku, (line, row) in rows.items():
+            try:
+                data = validators[sku in existing].run_validation(row)
+            except serializers.ValidationError as e:
+                self.fail(line, e.detail)
+                continue
+            data['sku'] = sku
+            if data.get('image'):
+                try:
+                    data['image'] = self.store_image(data['image'])
+                except ProductImportError as e:
+                    self.fail(line, {'image': [str(e)]})
+                    continue
+                images.append(data['image'])
+            else:
+                data.pop('image', None)
+            # Columns an update leaves out keep their current values.
+            products.append(Product(**{**existing.get(sku, {}), **data}))
+
+        if not self.dry_run and products:
+            Product.objects.bulk_create(
+                products, batch_size=self.batch_size,
+                update_conflicts=True, unique_fields=['sku'], update_fields=UPDATE_FIELDS,
+            )
+            # Bulk writes send no Product signals: refresh the catalog cache
+            # and queue image derivatives here instead.
+            bump_catalog_version()
+            transaction.on_commit(bump_catalog_version)
+            for name in images:
+                transaction.on_commit(lambda name=name: schedule_derivatives(name))
+        updated = sum(1 for product in products if product.sku in existing)
+        self.stats['created'] += len(products) - updated
+        self.stats['updated'] += updated
+
+    def store_image(self, path):
+        if self.image_root is None:
+            raise ProductImportError('Image import is not enabled.')
+        source = os.path.realpath(os.path.join(self.image_root, path))
+        if os.path.commonpath([source, self.image_root]) != self.image_root:
+            raise ProductImportError('Image path is outside the import directory.')
+        if not os.path.isfile(source):
+            raise ProductImportError(f'No such file: {path}')
+        target = posixpath.join(IMAGE_DIR, os.path.basename(source))
+        if self.dry_run:
+            return target
+        # Storage names are content-hashed, so re-importing a catalog reuses
+        # the stored file rather than piling up copies.
+        with open(source, 'rb') as f:
+            return default_storage.save(target, File(f))
@@ -0,0 +1,176 @@
+import decimal
+from operator import itemgetter
+
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+# DRF fields whose to_representation is a no-op on what the database driver
+# already returns (str/int/bool/float), so rows can pass them straight through.
+PASSTHROUGH_FIELDS = (serializers.CharField, serializers.IntegerField, serializers.BooleanField, serializers.FloatField)
+
+# Column plans kept per serializer class, one per distinct ?fields= selection.
+MAX_PLANS = 128
+
+
+def absolute_url(request, url):
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+def column(index, convert):
+    def get(row):
+        value = row[index]
+        return None if value is None else convert(value)
+    return get
+
+
+def converter(field):
+    """
+    ``field.to_representation`` with its per-call setup (timezone lookup,
+    decimal context) done once. Called per request: the active timezone
+    can differ between requests.
+    """
+    if isinstance(field, serializers.DateTimeField):
+        output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+        tz = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+        if output_format is None or output_format.lower() != ISO_8601 or tz is None:
+            return field.to_representation
+
+        def datetime_iso(value):
+            if timezone.is_naive(value):
+                return field.to_representation(value)
+            value = value.astimezone(tz).isoformat()
+            return value[:-6] + 'Z' if value.endswith('+00:00') else value
+        return datetime_iso
+
+    if isinstance(field, serializers.DecimalField):
+        coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+        if not coerce_to_string or field.localize or field.decimal_places is None:
+            return field.to_representation
+        exponent = decimal.Decimal(1).scaleb(-field.decimal_places)
+        context = decimal.getcontext().copy()
+        if field.max_digits is not None:
+            context.prec = field.max_digits
+
+        def decimal_string(value):
+            if not isinstance(value, decimal.Decimal):
+                return field.to_representation(value)
+            return '{:f}'.format(value.quantize(exponent, rounding=field.rounding, context=context))
+        return decimal_string
+
+    return field.to_representation
+
+
+class LeanSerializer:
+    """
+    Read-only twin of a ModelSerializer that renders ``values_list()`` rows.
+
+    The mapping from ``serializer_class``'s fields to columns and converters
+    is worked out once per class (and per sparse fieldset, see
+    shop.fieldsets), so serializing a row is one tuple fetch and a dict
+    build: no model instances, no per-row field binding. The output matches
+    ``serializer_class`` field for field, and only the columns the selected
+    fields need are read.
+
+    SerializerMethodFields have no object to look at; each one needs an
+    entry in ``computed``: ``name -> (columns, function(request, *values))``.
+    """
+
+    serializer_class = None
+    computed = {}
+
+    def __init__(self, context=None):
+        context = context or {}
+        self.request = context.get('request')
+        fieldset = context.get('fieldset')
+        self.names = fieldset.fields if fieldset is not None else None
+
+    @classmethod
+    def compiled(cls):
+        if '_compiled' not in cls.__dict__:
+            cls._compiled = cls.compile()
+        return cls._compiled
+
+    @classmethod
+    def compile(cls):
+        """``{name: (columns, build(request, column indexes) -> getter(row))}`` in field order."""
+        model = cls.serializer_class.Meta.model
+        specs = {}
+        for name, field in cls.serializer_class().fields.items():
+            if field.write_only:
+                continue
+            if name in cls.computed:
+                paths, function = cls.computed[name]
+                specs[name] = (paths, lambda request, indexes, function=function: (
+                    lambda row: function(request, *[row[i] for i in indexes])
+                ))
+                continue
+            if isinstance(field, (serializers.SerializerMethodField, serializers.BaseSerializer, serializers.ManyRelatedField)):
+                raise ImproperlyConfigured(f'{cls.__name__} needs a computed entry for {name!r}.')
+
+            path = field.source.replace('.', '__')
+            if isinstance(field, serializers.PrimaryKeyRelatedField):
+                path = model._meta.get_field(field.source).attname
+                build = lambda request, indexes: itemgetter(indexes[0])
+            elif isinstance(field, serializers.FileField):
+                storage = model._meta.get_field(field.source).storage
+                build = lambda request, indexes, storage=storage: column(
+                    indexes[0], lambda value: absolute_url(request, storage.url(value)) if value else None
+                )
+            elif isinstance(field, PASSTHROUGH_FIELDS):
+                build = lambda request, indexes: itemgetter(indexes[0])
+            else:
+                build = lambda request, indexes, field=field: column(indexes[0], converter(field))
+            specs[name] = ([path], build)
+        return specs
+
+    @classmethod
+    def plan(cls, names=None):
+        """``(columns, [(name, build, indexes), ...])`` for the fields in ``names`` (all by default)."""
+        key = None if names is None else tuple(names)
+        # Shared by every thread: only single get/set calls on the dict, and a
+        # full cache is swapped for a new one rather than cleared under
+        # another thread's lookup. A lost race just builds a plan twice.
+        plans = cls.__dict__.get('_plans')
+        if plans is None or len(plans) >= MAX_PLANS:
+            plans = cls._plans = {}
+        plan = plans.get(key)
+        if plan is None:
+            columns, mappers = [], []
+            for name, (paths, build) in cls.compiled().items():
+                if key is not None and name not in key:
+                    continue
+                for path in paths:
+                    if path not in columns:
+                        columns.append(path)
+                mappers.append((name, build, [columns.index(path) for path in paths]))
+            plan = plans[key] = columns, mappers
+        return plan
+
+    def rows(self, queryset):
+        """``queryset`` narrowed to the columns this serializer reads; paginate this."""
+        return queryset.values_list(*self.plan(self.names)[0])
+
+    def to_representation(self, rows):
+        _, mappers = self.plan(self.names)
+        getters = [(name, build(self.request, indexes)) for name, build, indexes in mappers]
+        return [{name: get(row) for name, get in getters} for row in rows]
+
+    def serialize(self, queryset):
+        return self.to_representation(self.rows(queryset))
+
+
+class LeanListMixin:
+    """``list()`` for generic views through ``lean_serializer_class`` instead of ModelSerializer instances."""
+
+    lean_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        lean = self.lean_serializer_class(context=self.get_serializer_context())
+        rows = lean.rows(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(lean.to_representation(page))
+        return Response(lean.to_representation(rows))
@@ -0,0 +1,96 @@
+import contextlib
+import json
+import sys
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from django.test.utils import setup_databases, teardown_databases
+from rest_framework.renderers import JSONRenderer
+
+from shop.models import OrderItem, Product, User
+from shop.renderers import FastJSONRenderer
+from shop.serializers import (
+    OrderItemLeanSerializer, OrderItemSerializer, ProductLeanSerializer, ProductSerializer,
+    UserLeanSerializer, UserSerializer,
+)
+
+CASES = {
+    'products': (lambda: Product.objects.order_by('id'), ProductSerializer, ProductLeanSerializer),
+    'order_items': (lambda: OrderItem.objects.order_by('id'), OrderItemSerializer, OrderItemLeanSerializer),
+    'users': (lambda: User.objects.order_by('id'), UserSerializer, UserLeanSerializer),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares rows/second of the ModelSerializer and lean (values_list) read paths, '
+        'and of DRF\'s JSON renderer against the orjson one, on a seeded scratch database'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10_000, help='Approximate rows per table')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per case; the best one is reported')
+        parser.add_argument('--only', nargs='*', choices=list(CASES))
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+
+    def handle(self, *args, **options):
+        if options['rows'] < 1 or options['repeat'] < 1:
+            raise CommandError('--rows and --repeat must be at least 1')
+        with contextlib.redirect_stdout(sys.stderr):
+            old_config = setup_databases(verbosity=0, interactive=False)
+            try:
+                call_command(
+                    'seed_data', seed=options['seed'], users=options['rows'], products=options['rows'],
+                    # seed_data gives orders 1-4 lines, so this lands near --rows order items.
+                    orders=options['rows'] * 2 // 5, reviews=0, carts=0, messages=0,
+                )
+                report = self.run(options)
+            finally:
+                teardown_databases(old_config, verbosity=0)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+            self.stderr.write(f"✔ Report written to {options['output']}")
+        else:
+            self.stdout.write(output)
+
+    def run(self, options):
+        context = {'request': RequestFactory().get('/api/products/')}
+        results = {}
+        for name in options['only'] or CASES:
+            self.stderr.write(f"… {name}")
+            queryset, serializer_class, lean_class = CASES[name]
+            rows = queryset().count()
+
+            full, full_data = self.best(options['repeat'], lambda: serializer_class(queryset(), many=True, context=context).data)
+            lean, lean_data = self.best(options['repeat'], lambda: lean_class(context=context).serialize(queryset()))
+            drf_json, body = self.best(options['repeat'], lambda: JSONRenderer().render(lean_data))
+            fast_json, _ = self.best(options['repeat'], lambda: FastJSONRenderer().render(lean_data))
+            if json.loads(JSONRenderer().render(full_data)) != json.loads(body):
+                raise CommandError(f'{name}: lean output differs from {serializer_class.__name__}')
+
+            results[name] = {
+                'rows': rows,
+                'serializer_rows_per_s': round(rows / full),
+                'lean_rows_per_s': round(rows / lean),
+                'serialize_speedup': round(full / lean, 1),
+                'drf_json_rows_per_s': round(rows / drf_json),
+                'fast_json_rows_per_s': round(rows / fast_json),
+                'render_speedup': round(drf_json / fast_json, 1),
+                'response_bytes': len(body),
+            }
+        return {'meta': {'rows': options['rows'], 'repeat': options['repeat']}, 'results': results}
+
+    def best(self, repeat, work):
+        """Fastest of ``repeat`` runs in seconds, and the last result."""
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = work()
+            timings.append(time.perf_counter() - start)
+        return min(timings), result
@@ -0,0 +1,193 @@
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.management.commands.run_benchmarks import percentile
+from shop.management.commands.seed_data import PASSWORD
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares write throughput of gunicorn workers on SQLite with and without '
+        'SQLITE_HIGH_CONCURRENCY, using a seeded scratch database'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='gunicorn worker processes')
+        parser.add_argument('--concurrency', type=int, default=16, help='Client threads')
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds per mode')
+        parser.add_argument('--users', type=int, default=32)
+        parser.add_argument('--products', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+
+    def handle(self, *args, **options):
+        if shutil.which('gunicorn') is None:
+            raise CommandError('gunicorn is not installed')
+
+        workdir = tempfile.mkdtemp(prefix='sqlite-bench-')
+        try:
+            template = os.path.join(workdir, 'template.sqlite3')
+            self.prepare_database(template, options)
+            report = {
+                'meta': {
+                    'workers': options['workers'],
+                    'concurrency': options['concurrency'],
+                    'duration_s': options['duration'],
+                    'users': options['users'],
+                    'products': options['products'],
+                },
+                'results': {},
+            }
+            for mode, enabled in (('default', '0'), ('high_concurrency', '1')):
+                database = os.path.join(workdir, f'{mode}.sqlite3')
+                shutil.copy(template, database)
+                self.stderr.write(f"… {mode}")
+                report['results'][mode] = self.run_mode(database, enabled, options)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    def environment(self, database, high_concurrency='0'):
+        env = dict(os.environ)
+        env.update({
+            'DATABASE_URL': f'sqlite:///{database}',
+            'SQLITE_HIGH_CONCURRENCY': high_concurrency,
+            'DJANGO_SETTINGS_MODULE': 'core.settings',
+        })
+        env.pop('DATABASE_REPLICA_URL', None)
+        return env
+
+    def manage(self, database, *args):
+        subprocess.run(
+            [sys.executable, 'manage.py', *args], cwd=settings.BASE_DIR,
+            env=self.environment(database), check=True,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+
+    def prepare_database(self, database, options):
+        self.stderr.write('… seeding scratch database')
+        self.manage(database, 'migrate', '--noinput')
+        self.manage(
+            database, 'seed_data', '--seed', str(options['seed']), '--users', str(options['users']),
+            '--products', str(options['products']), '--reviews', '0', '--carts', '0',
+            '--orders', '0', '--messages', '0',
+        )
+
+    def run_mode(self, database, high_concurrency, options):
+        port = free_port()
+        server = subprocess.Popen(
+            ['gunicorn', 'core.wsgi:application', '--workers', str(options['workers']),
+             '--bind', f'127.0.0.1:{port}', '--log-level', 'critical'],
+            cwd=settings.BASE_DIR, env=self.environment(database, high_concurrency),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            base = f'http://127.0.0.1:{port}/api'
+            self.wait_until_up(base)
+            tokens = [self.login(base, i) for i in range(options['users'])]
+            return self.load(base, tokens, options)
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    def wait_until_up(self, base, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                urllib.request.urlopen(f'{base}/products/search/', timeout=5)
+                return
+            except urllib.error.HTTPError:
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError('gunicorn did not start')
+
+    def request(self, method, url, payload=None, token=None):
+        data = json.dumps(payload).encode() if payload is not None else None
+        req = urllib.request.Request(url, data=data, method=method)
+        req.add_header('Content-Type', 'application/json')
+        if token:
+            req.add_header('Authorization', f'Bearer {token}')
+        try:
+            with urllib.request.urlopen(req, timeout=60) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    def login(self, base, index):
+        status, body = self.request(
+            'POST', f'{base}/login/', {'email': f'bench-user-{index}@example.com', 'password': PASSWORD}
+        )
+        if status != 200:
+            raise CommandError(f'login failed with {status}')
+        return json.loads(body)['access']
+
+    def load(self, base, tokens, options):
+        """Mixed cart/order/chat writes from many threads for ``duration`` seconds."""
+        lock = threading.Lock()
+        latencies, statuses = [], {}
+        deadline = time.monotonic() + options['duration']
+
+        def worker(seed):
+            rng = random.Random(seed)
+            token = tokens[seed % len(tokens)]
+            while time.monotonic() < deadline:
+                product = rng.randint(1, options['products'])
+                roll = rng.random()
+                start = time.perf_counter()
+                if roll < 0.5:
+                    status, _ = self.request('POST', f'{base}/cart/', {'product_id': product, 'quantity': 1}, token)
+                elif roll < 0.8:
+                    status, _ = self.request(
+                        'POST', f'{base}/orders/create/', {'items': [{'product': product, 'quantity': 1}]}, token
+                    )
+                else:
+                    status, _ = self.request('POST', f'{base}/chat/', {'recipient': 1, 'message': 'hello'}, token)
+                elapsed = (time.perf_counter() - start) * 1000
+                with lock:
+                    latencies.append(elapsed)
+                    statuses[status] = statuses.get(status, 0) + 1
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(options['concurrency']) as pool:
+            list(pool.map(worker, range(options['concurrency'])))
+        elapsed = time.monotonic() - started
+
+        latencies.sort()
+        ok = sum(count for status, count in statuses.items() if status < 400)
+        return {
+            'requests': len(latencies),
+            'ok': ok,
+            'errors': len(latencies) - ok,
+            'statuses': {str(k): v for k, v in sorted(statuses.items())},
+            'ok_per_second': round(ok / elapsed, 1),
+            'p50_ms': round(percentile(latencies, 50) or 0, 2),
+            'p95_ms': round(percentile(latencies, 95) or 0, 2),
+            'p99_ms': round(percentile(latencies, 99) or 0, 2),
+        }
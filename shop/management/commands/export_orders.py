@@ -0,0 +1,43 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.exports import CHUNK_SIZE, FORMATS, ExportError, export_orders
+
+
+class Command(BaseCommand):
+    help = 'Streams orders and their items as CSV or NDJSON, with flat memory use'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=list(FORMATS), default='csv', dest='fmt')
+        parser.add_argument('--start', help='ISO date or datetime, inclusive')
+        parser.add_argument('--end', help='ISO datetime (exclusive) or date (that whole day included)')
+        parser.add_argument('--status', action='append', default=[], help='Order status; repeat for several')
+        parser.add_argument('--payment-status', action='append', default=[])
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument('--output', help='Write to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        try:
+            lines, _ = export_orders(
+                options['fmt'],
+                chunk_size=options['chunk_size'],
+                start=options['start'],
+                end=options['end'],
+                statuses=options['status'],
+                payment_statuses=options['payment_status'],
+            )
+        except ExportError as e:
+            raise CommandError(str(e))
+
+        out = open(options['output'], 'w', newline='', encoding='utf-8') if options['output'] else sys.stdout
+        count = 0
+        try:
+            for line in lines:
+                out.write(line)
+                count += 1
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        if options['output']:
+            self.stderr.write(f"✔ Wrote {count} lines to {options['output']}")
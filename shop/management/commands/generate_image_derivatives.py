@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from shop.images import generate_derivatives
+from shop.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Generates resized WebP/JPEG derivatives for existing product images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Regenerate derivatives that already exist')
+
+    def handle(self, *args, **options):
+        names = (
+            Product.objects.exclude(image='').exclude(image__isnull=True)
+            .values_list('image', flat=True).distinct()
+        )
+        written = 0
+        for name in names.iterator():
+            try:
+                written += generate_derivatives(name, force=options['force'])
+            except Exception as e:
+                self.stderr.write(f"⚠ {name}: {e}")
+        self.stdout.write(self.style.SUCCESS(f"✔ Wrote {written} derivative images."))
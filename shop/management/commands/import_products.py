@@ -0,0 +1,49 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.imports import BATCH_SIZE, FORMATS, ProductImporter, ProductImportError, format_for, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Bulk imports products from CSV or NDJSON, upserting on sku'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import')
+        parser.add_argument('--format', choices=FORMATS, dest='fmt', help='Default: from the file extension')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            '--image-root', default=settings.PRODUCT_IMPORT_IMAGE_ROOT,
+            help='Directory image paths are resolved in (default: PRODUCT_IMPORT_IMAGE_ROOT)',
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Validate only, write nothing')
+
+    def handle(self, *args, **options):
+        try:
+            fmt = format_for(options['path'], options['fmt'])
+        except ProductImportError as e:
+            raise CommandError(str(e))
+
+        importer = ProductImporter(
+            batch_size=options['batch_size'],
+            image_root=options['image_root'],
+            dry_run=options['dry_run'],
+            progress=self.show_progress,
+        )
+        with open(options['path'], newline='', encoding='utf-8-sig') as f:
+            report = importer.run(read_rows(f, fmt))
+
+        for error in report['errors']:
+            self.stderr.write(f"⚠ line {error['line']}: {json.dumps(error['errors'])}")
+        verb = 'Validated' if options['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f"✔ {verb} {report['processed']} rows: {report['created']} created, {report['updated']} updated, "
+            f"{report['failed']} failed ({report['rows_per_second']} rows/s)."
+        ))
+
+    def show_progress(self, report):
+        self.stderr.write(
+            f"… {report['processed']} rows ({report['created']} created, {report['updated']} updated, "
+            f"{report['failed']} failed, {report['rows_per_second']} rows/s)"
+        )
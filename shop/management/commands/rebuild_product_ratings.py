@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from shop.caching import bump_catalog_version
+from shop.models import Product
+from shop.ratings import RATING_FIELDS, expected_ratings
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the stored rating aggregates on Product from its reviews'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only report differences, do not write')
+
+    def handle(self, *args, **options):
+        empty = dict.fromkeys(RATING_FIELDS, 0)
+        to_update = []
+        with transaction.atomic():
+            expected = expected_ratings()
+            for product in Product.objects.select_for_update().only('id', *RATING_FIELDS).iterator(chunk_size=2000):
+                values = expected.get(product.pk, empty)
+                if any(self.differs(getattr(product, field), values[field]) for field in RATING_FIELDS):
+                    for field in RATING_FIELDS:
+                        setattr(product, field, values[field])
+                    to_update.append(product)
+
+            if not options['check'] and to_update:
+                Product.objects.bulk_update(to_update, RATING_FIELDS, batch_size=500)
+                transaction.on_commit(bump_catalog_version)
+
+        verb = 'Found' if options['check'] else 'Fixed'
+        self.stdout.write(self.style.SUCCESS(f"✔ {verb} {len(to_update)} products with stale ratings."))
+
+    def differs(self, stored, expected):
+        if isinstance(expected, float):
+            return abs(stored - expected) > 1e-9
+        return stored != expected
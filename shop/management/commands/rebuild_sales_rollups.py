@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from shop.models import DailySales, ProductSales
+from shop.sales import expected_rollups
+
+
+class Command(BaseCommand):
+    help = 'Backfills the sales rollup tables from order history and fixes any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only report differences, do not write')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            per_product, per_day = expected_rollups()
+            product_fixes = self.reconcile(
+                ProductSales.objects.select_for_update(), 'product_id', per_product,
+                ('quantity_sold', 'revenue'), options['check'],
+            )
+            day_fixes = self.reconcile(
+                DailySales.objects.select_for_update(), 'day', per_day,
+                ('order_count', 'quantity_sold', 'revenue'), options['check'],
+            )
+
+        verb = 'Found' if options['check'] else 'Fixed'
+        self.stdout.write(self.style.SUCCESS(
+            f"✔ {verb} {product_fixes} product rows and {day_fixes} daily rows out of sync."
+        ))
+
+    def reconcile(self, queryset, key_field, expected, value_fields, check_only):
+        model = queryset.model
+        existing = {getattr(row, key_field): row for row in queryset}
+        to_create, to_update = [], []
+
+        for key, values in expected.items():
+            row = existing.pop(key, None)
+            if row is None:
+                to_create.append(model(**{key_field: key}, **dict(zip(value_fields, values))))
+                continue
+            if tuple(getattr(row, f) for f in value_fields) != tuple(values):
+                for field, value in zip(value_fields, values):
+                    setattr(row, field, value)
+                to_update.append(row)
+
+        # Rows left over have no counted orders behind them any more.
+        stale = [row.pk for row in existing.values()
+                 if any(getattr(row, f) for f in value_fields)]
+
+        if not check_only:
+            model.objects.bulk_create(to_create, batch_size=500)
+            model.objects.bulk_update(to_update, value_fields, batch_size=500)
+            model.objects.filter(pk__in=stale).update(**{f: 0 for f in value_fields})
+        return len(to_create) + len(to_update) + len(stale)
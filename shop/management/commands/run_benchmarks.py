@@ -0,0 +1,182 @@
+import contextlib
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_databases, teardown_databases
+from rest_framework_simplejwt.tokens import AccessToken
+
+from shop.models import Product, User
+
+SEED_OPTIONS = ('seed', 'users', 'products', 'reviews', 'carts', 'orders', 'messages')
+SEARCH_TERMS = ['galaxy', 'sams', 'pro max', 'wireless', 'bat', 'apple air', 'noise cancel']
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+class Scenarios:
+    """Request builders for each benchmarked endpoint, all driven from one seeded RNG."""
+
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+        self.admin = User.objects.get(email='bench-admin@example.com')
+        self.customer = User.objects.get(email='bench-user-0@example.com')
+        self.product_ids = list(Product.objects.order_by('id').values_list('id', flat=True))
+        self.anonymous = Client()
+        self.as_admin = self.client_for(self.admin)
+        self.as_customer = self.client_for(self.customer)
+
+    def client_for(self, user):
+        return Client(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+
+    def all(self):
+        return {
+            'product_list': lambda: self.anonymous.get('/api/products/'),
+            'product_search': lambda: self.anonymous.get(
+                '/api/products/search/', {'search': self.rng.choice(SEARCH_TERMS)}
+            ),
+            'cart_get': lambda: self.as_customer.get('/api/cart/'),
+            'cart_add': lambda: self.as_customer.post(
+                '/api/cart/', {'product_id': self.rng.choice(self.product_ids), 'quantity': 1},
+                content_type='application/json',
+            ),
+            'create_order': lambda: self.as_customer.post(
+                '/api/orders/create/',
+                {'items': [
+                    {'product': pk, 'quantity': self.rng.randint(1, 3)}
+                    for pk in self.rng.sample(self.product_ids, 3)
+                ]},
+                content_type='application/json',
+            ),
+            'get_all_orders': lambda: self.as_admin.get('/api/orders/'),
+            'dashboard_stats': lambda: self.as_admin.get('/api/dashboard/stats/'),
+            'chat_history': lambda: self.as_customer.get('/api/chat/', {'with': self.admin.id}),
+            'notifications': lambda: self.as_customer.get('/api/notifications/'),
+        }
+
+
+class Command(BaseCommand):
+    help = 'Drives the main API endpoints in-process and reports p50/p95/p99 latency, queries and memory as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--only', nargs='*', help='Scenario names to run (default: all)')
+        parser.add_argument('--cold-cache', action='store_true', help='Clear the cache before every request')
+        parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+        parser.add_argument(
+            '--existing', action='store_true',
+            help='Run against the configured database (already seeded) instead of a throwaway one',
+        )
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--reviews', type=int, default=3000)
+        parser.add_argument('--carts', type=int, default=100)
+        parser.add_argument('--orders', type=int, default=2000)
+        parser.add_argument('--messages', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be at least 1')
+        old_config = None
+        if not options['existing']:
+            # Keep stdout for the JSON report; migrations and seeding chat on it.
+            with contextlib.redirect_stdout(sys.stderr):
+                old_config = setup_databases(verbosity=0, interactive=False)
+                seed_args = {name: options[name] for name in SEED_OPTIONS}
+                call_command('seed_data', **seed_args)
+        try:
+            with override_settings(DEBUG=False, ALLOWED_HOSTS=['testserver']):
+                report = self.run(options)
+        finally:
+            if old_config is not None:
+                teardown_databases(old_config, verbosity=0)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+            self.stderr.write(f"✔ Report written to {options['output']}")
+        else:
+            self.stdout.write(output)
+
+    def run(self, options):
+        cache.clear()
+        scenarios = Scenarios(options['seed']).all()
+        selected = options['only'] or list(scenarios)
+        unknown = set(selected) - set(scenarios)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+        results = {}
+        for name in selected:
+            self.stderr.write(f"… {name}")
+            results[name] = self.measure(scenarios[name], options)
+
+        return {
+            'meta': {
+                'timestamp': datetime.now(dt_timezone.utc).isoformat(),
+                'python': platform.python_version(),
+                'database': connection.vendor,
+                'iterations': options['iterations'],
+                'warmup': options['warmup'],
+                'cold_cache': options['cold_cache'],
+                'dataset': None if options['existing'] else {name: options[name] for name in SEED_OPTIONS},
+            },
+            'results': results,
+        }
+
+    def measure(self, request, options):
+        for _ in range(options['warmup']):
+            request()
+
+        latencies, query_counts, errors = [], [], 0
+        for _ in range(options['iterations']):
+            if options['cold_cache']:
+                cache.clear()
+            with CaptureQueriesContext(connection) as ctx:
+                start = time.perf_counter()
+                response = request()
+                elapsed = time.perf_counter() - start
+            latencies.append(elapsed * 1000)
+            query_counts.append(len(ctx.captured_queries))
+            if response.status_code >= 400:
+                errors += 1
+
+        # Separate pass: tracemalloc slows allocation-heavy code down a lot.
+        if options['cold_cache']:
+            cache.clear()
+        tracemalloc.start()
+        response = request()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        latencies.sort()
+        return {
+            'status': response.status_code,
+            'errors': errors,
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+            'p99_ms': round(percentile(latencies, 99), 3),
+            'mean_ms': round(sum(latencies) / len(latencies), 3),
+            'queries_per_request': round(sum(query_counts) / len(query_counts), 2),
+            'max_queries': max(query_counts),
+            'peak_memory_kb': round(peak / 1024, 1),
+            'response_bytes': len(response.content),
+        }
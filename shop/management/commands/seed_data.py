@@ -0,0 +1,183 @@
+import random
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+
+from shop.caching import bump_catalog_version
+from shop.models import (
+    CartItem, ChatMessage, Notification, NotificationCounter, Order, OrderItem, Product, Review, User,
+)
+
+BRANDS = ['Samsung', 'Apple', 'Xiaomi', 'OnePlus', 'Nokia', 'Realme', 'Oppo', 'Vivo', 'JBL', 'Sony']
+CATEGORIES = ['phone', 'tablet', 'laptop', 'watch', 'earbuds', 'speaker', 'charger', 'accessory']
+MODELS = ['Galaxy', 'Note', 'Pro', 'Max', 'Lite', 'Ultra', 'Neo', 'Prime', 'Edge', 'Air', 'Mini', 'Plus']
+WORDS = [
+    'battery', 'camera', 'display', 'fast', 'charging', 'wireless', 'bluetooth', 'storage', 'memory',
+    'waterproof', 'amoled', 'retina', 'gaming', 'slim', 'premium', 'budget', 'bass', 'noise', 'cancelling',
+]
+STATUSES = ['pending', 'processing', 'shipped', 'delivered', 'delivered', 'delivered', 'cancelled']
+
+# Fixed anchor so two runs with the same seed produce identical rows.
+EPOCH = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+PASSWORD = 'bench-pass-123'
+# Seeded users have emails and seeded products SKUs starting with this, so a
+# rerun can find and replace them.
+PREFIX = 'bench-'
+BATCH = 1000
+
+
+class Command(BaseCommand):
+    help = 'Deterministically generates users, products, reviews, carts, orders and chat messages'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--reviews', type=int, default=3000)
+        parser.add_argument('--carts', type=int, default=100, help='Users that get a cart')
+        parser.add_argument('--orders', type=int, default=2000)
+        parser.add_argument('--messages', type=int, default=2000)
+        parser.add_argument('--flush', action='store_true', help='Delete previously seeded rows first')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            if options['flush']:
+                self.flush()
+            elif self.already_seeded():
+                raise CommandError('Seed data is already present; pass --flush to replace it.')
+            admin, users = self.seed_users(options['users'])
+            products = self.seed_products(rng, options['products'])
+            self.seed_reviews(rng, options['reviews'], users, products)
+            self.seed_carts(rng, options['carts'], users, products)
+            self.seed_orders(rng, options['orders'], users, products)
+            self.seed_messages(rng, options['messages'], admin, users)
+        call_command('rebuild_sales_rollups', stdout=self.stdout)
+        call_command('rebuild_product_ratings', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f"✔ Seeded {len(users)} users, {len(products)} products, {options['reviews']} reviews, "
+            f"{options['orders']} orders and {options['messages']} messages (seed {options['seed']})."
+        ))
+
+    def already_seeded(self):
+        return (
+            User.objects.filter(email__startswith=PREFIX).exists()
+            or Product.objects.filter(sku__startswith=PREFIX).exists()
+        )
+
+    def flush(self):
+        # Cascades to the seeded orders, reviews, carts, messages and
+        # notifications, including rows other users left on seeded products.
+        Product.objects.filter(sku__startswith=PREFIX).delete()
+        User.objects.filter(email__startswith=PREFIX).delete()
+
+    def seed_users(self, count):
+        password = make_password(PASSWORD)
+        admin = User(
+            email=f'{PREFIX}admin@example.com', full_name='Bench Admin', contact='9800000000',
+            address='Kathmandu', password=password, is_staff=True, is_superuser=True,
+        )
+        users = [
+            User(email=f'{PREFIX}user-{i}@example.com', full_name=f'Bench User {i}',
+                 contact=f'98{i:08d}', address='Kathmandu', password=password)
+            for i in range(count)
+        ]
+        User.objects.bulk_create([admin] + users, batch_size=BATCH)
+        return admin, users
+
+    def seed_products(self, rng, count):
+        products = []
+        for i in range(count):
+            brand = rng.choice(BRANDS)
+            name = f'{brand} {rng.choice(MODELS)} {rng.randint(1, 20)}'
+            products.append(Product(
+                sku=f'{PREFIX}{i:06d}',
+                name=name,
+                brand=brand,
+                price=Decimal(rng.randint(500, 200000)) / 100 * 10,
+                discount=rng.choice([0, 0, 5, 10, 15, 20, 25]),
+                quantity=1_000_000,
+                description=' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 30))),
+                category=rng.choice(CATEGORIES),
+                warranty=f'{rng.randint(0, 2)} year',
+            ))
+        Product.objects.bulk_create(products, batch_size=BATCH)
+        # bulk_create sends no post_save, so invalidate the catalog cache here.
+        bump_catalog_version()
+        return products
+
+    def seed_reviews(self, rng, count, users, products):
+        Review.objects.bulk_create([
+            Review(
+                product=rng.choice(products), user=rng.choice(users), rating=rng.randint(1, 5),
+                comment=' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 15))),
+            )
+            for _ in range(count)
+        ], batch_size=BATCH)
+
+    def seed_carts(self, rng, count, users, products):
+        items = []
+        for user in users[:count]:
+            for product in rng.sample(products, min(rng.randint(1, 5), len(products))):
+                items.append(CartItem(user=user, product=product, quantity=rng.randint(1, 3)))
+        CartItem.objects.bulk_create(items, batch_size=BATCH)
+
+    def seed_orders(self, rng, count, users, products):
+        orders, lines_per_order = [], []
+        for _ in range(count):
+            lines = []
+            for product in rng.sample(products, min(rng.randint(1, 4), len(products))):
+                lines.append(OrderItem(product=product, quantity=rng.randint(1, 3), price=product.discounted_price()))
+            total = sum(line.price * line.quantity for line in lines)
+            orders.append(Order(
+                user=rng.choice(users), total_price=total, order_status=rng.choice(STATUSES),
+                payment_method=rng.choice(['COD', 'eSewa', 'Khalti']),
+            ))
+            lines_per_order.append(lines)
+        Order.objects.bulk_create(orders, batch_size=BATCH)
+
+        # auto_now_add ignores explicit values, so spread the dates afterwards.
+        for i, order in enumerate(orders):
+            order.created_at = EPOCH + timedelta(minutes=i * 7 + rng.randint(0, 6))
+        Order.objects.bulk_update(orders, ['created_at'], batch_size=BATCH)
+
+        items, notifications = [], []
+        for order, lines in zip(orders, lines_per_order):
+            for line in lines:
+                line.order = order
+                items.append(line)
+            notifications.append(Notification(
+                user_id=order.user_id, order=order, status=order.order_status,
+                message=f'Your order #{order.id} status changed to {order.order_status.capitalize()}.',
+                is_read=rng.random() < 0.7,
+            ))
+        OrderItem.objects.bulk_create(items, batch_size=BATCH)
+        Notification.objects.bulk_create(notifications, batch_size=BATCH)
+
+        # bulk_create skips the signals that maintain the unread counters.
+        seeded = {'user__email__startswith': f'{PREFIX}user-'}
+        unread = (
+            Notification.objects.filter(is_read=False, **seeded)
+            .values('user_id').annotate(unread=Count('id'))
+        )
+        NotificationCounter.objects.filter(**seeded).delete()
+        NotificationCounter.objects.bulk_create(
+            [NotificationCounter(user_id=row['user_id'], unread=row['unread']) for row in unread],
+            batch_size=BATCH,
+        )
+
+    def seed_messages(self, rng, count, admin, users):
+        messages = []
+        for _ in range(count):
+            user = rng.choice(users)
+            sender, recipient = (user, admin) if rng.random() < 0.5 else (admin, user)
+            messages.append(ChatMessage(
+                sender=sender, recipient=recipient,
+                message=' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 20))),
+            ))
+        ChatMessage.objects.bulk_create(messages, batch_size=BATCH)
@@ -0,0 +1,305 @@
+import contextvars
+import json
+import logging
+import os
+import re
+import time
+import zlib
+from contextlib import ExitStack
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils.cache import patch_vary_headers
+from whitenoise.middleware import WhiteNoiseMiddleware
+from whitenoise.responders import IsDirectoryError, MissingFileError
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional, gzip only without it
+    brotli = None
+
+from .storage import HASHED_NAME
+
+logger = logging.getLogger('shop.metrics')
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.serialize_depth = 0
+        self.statements = {}
+
+    def record_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.queries += 1
+            self.db_time += elapsed
+            # Parameters are separate, so identical statements share one key.
+            count, total = self.statements.get(sql, (0, 0.0))
+            self.statements[sql] = (count + 1, total + elapsed)
+
+    def top_statements(self, limit):
+        ranked = sorted(self.statements.items(), key=lambda item: (-item[1][0], -item[1][1]))
+        return [
+            {'sql': sql, 'count': count, 'total_ms': round(total * 1000, 2)}
+            for sql, (count, total) in ranked[:limit]
+        ]
+
+
+def _timed_representation(to_representation):
+    @wraps(to_representation)
+    def wrapped(self, *args, **kwargs):
+        metrics = _current.get()
+        # Only the outermost serializer is timed; nested ones are inside it.
+        if metrics is None or metrics.serialize_depth:
+            return to_representation(self, *args, **kwargs)
+        metrics.serialize_depth += 1
+        start = time.perf_counter()
+        try:
+            return to_representation(self, *args, **kwargs)
+        finally:
+            metrics.serialize_time += time.perf_counter() - start
+            metrics.serialize_depth -= 1
+    wrapped._request_metrics = True
+    return wrapped
+
+
+def instrument_serializers():
+    """Wrap DRF's to_representation once so serializer time can be attributed."""
+    from rest_framework import serializers
+
+    for cls in (serializers.Serializer, serializers.ListSerializer):
+        if not getattr(cls.to_representation, '_request_metrics', False):
+            cls.to_representation = _timed_representation(cls.to_representation)
+
+
+def loggable_path(request):
+    """The full path minus credentials passed in the query (SSE ``?token=``)."""
+    query = request.GET.copy()
+    query.pop('token', None)
+    return request.path + ('?' + query.urlencode() if query else '')
+
+
+class RequestMetricsMiddleware:
+    """
+    Per-request SQL count, DB time, serializer time and wall time.
+
+    Reported as a Server-Timing header, plus a structured warning on the
+    ``shop.metrics`` logger with the most repeated statements whenever a
+    request takes longer than REQUEST_METRICS_SLOW_MS. When
+    REQUEST_METRICS_ENABLED is off the middleware removes itself from the
+    chain at startup, so it costs nothing.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_METRICS_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, 'REQUEST_METRICS_SLOW_MS', 500)
+        self.top_queries = getattr(settings, 'REQUEST_METRICS_TOP_QUERIES', 5)
+        instrument_serializers()
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics.record_query))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total_ms = (time.perf_counter() - start) * 1000
+
+        db_ms = metrics.db_time * 1000
+        serialize_ms = metrics.serialize_time * 1000
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={db_ms:.2f};desc="{metrics.queries} queries"',
+            f'serialize;dur={serialize_ms:.2f}',
+            f'total;dur={total_ms:.2f}',
+        ])
+
+        if total_ms >= self.slow_ms:
+            entry = {
+                'method': request.method,
+                'path': loggable_path(request),
+                'status': response.status_code,
+                'total_ms': round(total_ms, 2),
+                'db_ms': round(db_ms, 2),
+                'serialize_ms': round(serialize_ms, 2),
+                'queries': metrics.queries,
+                'top_queries': metrics.top_statements(self.top_queries),
+            }
+            logger.warning('slow request %s', json.dumps(entry), extra={'request_metrics': entry})
+        return response
+
+
+GZIP_LEVEL = 6
+# Brotli's top qualities are far too slow to run per response.
+BROTLI_QUALITY = 5
+COMPRESSIBLE_TYPES = re.compile(r'^(text/|application/(json|x-ndjson|javascript|xml)|image/svg\+xml)')
+
+
+def accepted_encoding(header):
+    """
+    The coding to use for an Accept-Encoding header: ``'br'``, ``'gzip'`` or
+    None. Highest q-value wins; brotli wins ties.
+    """
+    weights = {}
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        q = 1.0
+        match = re.search(r'q=([0-9.]+)', params)
+        if match:
+            try:
+                q = float(match.group(1))
+            except ValueError:
+                continue
+        weights[coding.strip().lower()] = q
+    offered = (['br'] if brotli is not None else []) + ['gzip']
+    best, best_q = None, 0.0
+    for coding in offered:
+        q = weights.get(coding, weights.get('*', 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress(coding, data):
+    if coding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+def compress_stream(coding, chunks):
+    """Compress an iterator of bytes, flushing after every chunk so it still arrives incrementally."""
+    if coding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        for chunk in chunks:
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+    else:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+
+
+class CompressionMiddleware:
+    """
+    Negotiated brotli/gzip for responses under COMPRESSION_PATH_PREFIXES.
+
+    Only text-like content types are compressed, and only bodies of at least
+    COMPRESSION_MIN_SIZE bytes: below that the headers cost more than they
+    save. Streaming responses (exports, import progress) are compressed chunk
+    by chunk; async streams such as chat are left alone. Admin pages are
+    outside the default prefixes, which keeps CSRF tokens out of compressed
+    bodies (BREACH).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+        self.prefixes = tuple(getattr(settings, 'COMPRESSION_PATH_PREFIXES', ('/api/',)))
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not request.path.startswith(self.prefixes):
+            return response
+        if response.status_code in (206, 304) or response.has_header('Content-Encoding'):
+            return response
+        if not COMPRESSIBLE_TYPES.match(response.get('Content-Type', '')):
+            return response
+        if 'no-transform' in response.get('Cache-Control', ''):
+            return response
+        # Whatever the outcome, the body depends on Accept-Encoding from here on.
+        patch_vary_headers(response, ('Accept-Encoding',))
+        coding = accepted_encoding(request.headers.get('Accept-Encoding', ''))
+        if coding is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                return response
+            response.streaming_content = compress_stream(coding, response.streaming_content)
+            del response['Content-Length']
+        else:
+            if len(response.content) < self.min_size:
+                return response
+            compressed = compress(coding, response.content)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        # Same resource, different bytes: a strong ETag no longer holds.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = coding
+        return response
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise for STATIC_ROOT plus MEDIA_ROOT under MEDIA_URL.
+
+    Static files are indexed at startup as usual. Uploads keep arriving, so
+    media files are looked up per request instead. Either way the response
+    supports HEAD, Range and conditional requests, serves .gz/.br siblings
+    when the client accepts them, and goes out through the server's
+    ``wsgi.file_wrapper`` (sendfile) rather than being copied in Python.
+
+    Content-hashed names (collectstatic output, HashedMediaStorage uploads
+    and their derivatives) are cached as immutable; other media files for
+    MEDIA_CACHE_MAX_AGE seconds.
+    """
+
+    def __init__(self, get_response=None, settings=settings):
+        # Set first: indexing STATIC_ROOT already calls add_cache_headers().
+        self.media_prefix = settings.MEDIA_URL
+        self.media_root = os.path.abspath(settings.MEDIA_ROOT)
+        self.media_max_age = getattr(settings, 'MEDIA_CACHE_MAX_AGE', 24 * 60 * 60)
+        super().__init__(get_response, settings)
+
+    def __call__(self, request):
+        if self.media_prefix and request.path_info.startswith(self.media_prefix):
+            static_file = self.find_media_file(request.path_info)
+            if static_file is not None:
+                return self.serve(static_file, request)
+            return self.get_response(request)
+        return super().__call__(request)
+
+    def find_media_file(self, url):
+        if not self.url_is_canonical(url):
+            return None
+        path = os.path.join(self.media_root, url[len(self.media_prefix):])
+        if os.path.commonpath([path, self.media_root]) != self.media_root:
+            return None
+        try:
+            return self.get_static_file(path, url)
+        except (MissingFileError, IsDirectoryError):
+            return None
+
+    def add_cache_headers(self, headers, path, url):
+        if not (self.media_prefix and url.startswith(self.media_prefix)):
+            return super().add_cache_headers(headers, path, url)
+        if HASHED_NAME.search(url):
+            headers['Cache-Control'] = f'max-age={self.FOREVER}, public, immutable'
+        else:
+            headers['Cache-Control'] = f'max-age={self.media_max_age}, public'
@@ -0,0 +1,79 @@
+from django.db import migrations
+
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE shop_product_fts USING fts5(
+        name, brand, description,
+        content='shop_product', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER shop_product_fts_ai AFTER INSERT ON shop_product BEGIN
+        INSERT INTO shop_product_fts(rowid, name, brand, description)
+        VALUES (new.id, new.name, new.brand, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER shop_product_fts_ad AFTER DELETE ON shop_product BEGIN
+        INSERT INTO shop_product_fts(shop_product_fts, rowid, name, brand, description)
+        VALUES ('delete', old.id, old.name, old.brand, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER shop_product_fts_au AFTER UPDATE OF name, brand, description ON shop_product BEGIN
+        INSERT INTO shop_product_fts(shop_product_fts, rowid, name, brand, description)
+        VALUES ('delete', old.id, old.name, old.brand, old.description);
+        INSERT INTO shop_product_fts(rowid, name, brand, description)
+        VALUES (new.id, new.name, new.brand, new.description);
+    END
+    """,
+    "INSERT INTO shop_product_fts(shop_product_fts) VALUES ('rebuild')",
+]
+
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS shop_product_fts_au",
+    "DROP TRIGGER IF EXISTS shop_product_fts_ad",
+    "DROP TRIGGER IF EXISTS shop_product_fts_ai",
+    "DROP TABLE IF EXISTS shop_product_fts",
+]
+
+POSTGRESQL_FORWARD = [
+    """
+    ALTER TABLE shop_product ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(brand, '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(description, '')), 'C')
+    ) STORED
+    """,
+    "CREATE INDEX shop_product_search_vector_gin ON shop_product USING GIN (search_vector)",
+]
+
+POSTGRESQL_REVERSE = [
+    "DROP INDEX IF EXISTS shop_product_search_vector_gin",
+    "ALTER TABLE shop_product DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def run_statements(statements):
+    def run(apps, schema_editor):
+        vendor_statements = statements.get(schema_editor.connection.vendor, [])
+        for sql in vendor_statements:
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0019_notification_order_notification_status'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_statements({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRESQL_FORWARD}),
+            run_statements({'sqlite': SQLITE_REVERSE, 'postgresql': POSTGRESQL_REVERSE}),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0021_order_order_created_id_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('order_count', models.IntegerField(default=0)),
+                ('quantity_sold', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity_sold', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='sales', to='shop.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-quantity_sold'], name='productsales_qty_idx')],
+            },
+        ),
+    ]
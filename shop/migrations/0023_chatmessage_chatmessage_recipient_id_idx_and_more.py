@@ -0,0 +1,21 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0022_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['recipient', 'id'], name='chatmessage_recipient_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['sender', 'id'], name='chatmessage_sender_id_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def count_unread(apps, schema_editor):
+    Notification = apps.get_model('shop', 'Notification')
+    NotificationCounter = apps.get_model('shop', 'NotificationCounter')
+    rows = (
+        Notification.objects.filter(is_read=False)
+        .values('user_id').annotate(unread=models.Count('id'))
+    )
+    NotificationCounter.objects.bulk_create(
+        [NotificationCounter(user_id=row['user_id'], unread=row['unread']) for row in rows],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0023_chatmessage_chatmessage_recipient_id_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='notification_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('unread', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'is_read', 'created_at'], name='notification_user_read_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'id'], name='notification_user_id_idx'),
+        ),
+        migrations.RunPython(count_unread, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:33
+
+import django.core.validators
+import django.db.models.expressions
+import django.db.models.functions.comparison
+import django.db.models.functions.math
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0026_product_facet_indexes'),
+    ]
+
+    operations = [
+        # 0026 indexed the facet filters on the raw price; the catalog now
+        # sorts and filters on effective_price, so those two indexes are
+        # rebuilt on it below under the same names.
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_cat_brand_price_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_brand_price_idx',
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.math.Round(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('price'), '*', django.db.models.expressions.CombinedExpression(models.Value(100), '-', django.db.models.functions.comparison.Greatest(django.db.models.functions.comparison.Least(models.F('discount'), 100), 0))), '*', models.Value(Decimal('0.01'))), 2), output_field=models.DecimalField(decimal_places=2, max_digits=10)),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='discount',
+            field=models.IntegerField(default=0, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(100)]),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['effective_price', 'id'], name='product_effective_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'brand', 'effective_price'], name='product_cat_brand_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['brand', 'effective_price'], name='product_brand_price_idx'),
+        ),
+    ]
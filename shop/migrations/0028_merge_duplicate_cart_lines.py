@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:35
+
+from django.db import migrations, models
+
+
+def merge_duplicate_lines(apps, schema_editor):
+    CartItem = apps.get_model('shop', 'CartItem')
+    duplicates = (
+        CartItem.objects.values('user_id', 'product_id')
+        .annotate(lines=models.Count('id'), total=models.Sum('quantity'), keep=models.Min('id'))
+        .filter(lines__gt=1)
+    )
+    for row in duplicates:
+        lines = CartItem.objects.filter(user_id=row['user_id'], product_id=row['product_id'])
+        lines.exclude(pk=row['keep']).delete()
+        lines.filter(pk=row['keep']).update(quantity=row['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0027_product_effective_price'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_lines, migrations.RunPython.noop),
+    ]
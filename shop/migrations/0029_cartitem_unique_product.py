@@ -0,0 +1,17 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0028_merge_duplicate_cart_lines'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(fields=('user', 'product'), name='cartitem_user_product_uniq'),
+        ),
+    ]
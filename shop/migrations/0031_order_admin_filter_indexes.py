@@ -0,0 +1,21 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0030_product_sku'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['order_status', '-created_at', '-id'], name='order_status_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['payment_status', '-created_at', '-id'], name='order_payment_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:58
+
+from django.db import migrations, models
+
+
+def backfill_updated_at(apps, schema_editor):
+    # Existing orders would otherwise all look changed at migration time.
+    Order = apps.get_model('shop', 'Order')
+    Order.objects.update(updated_at=models.F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0031_order_admin_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'updated_at'], name='order_user_updated_idx'),
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+    ]
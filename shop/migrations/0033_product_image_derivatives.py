@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 11:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0032_order_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='image_derivatives',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100),
+        ),
+    ]
@@ -1,4 +1,9 @@
+from decimal import Decimal
+
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.db.models import F, Value
+from django.db.models.functions import Greatest, Least, Round
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager
 from django.conf import settings
 
@@ -35,22 +40,85 @@ class User(AbstractBaseUser, PermissionsMixin):
         return self.email
 
 class Product(models.Model):
+    # Supplier's stock keeping unit; the key bulk imports upsert on.
+    sku = models.CharField(max_length=64, unique=True, blank=True, null=True)
     name = models.CharField(max_length=255)
     brand = models.CharField(max_length=100)
     price = models.DecimalField(max_digits=10, decimal_places=2)
-    discount = models.IntegerField(default=0)  # in %
+    discount = models.IntegerField(default=0, validators=[MinValueValidator(0), MaxValueValidator(100)])  # in %
     quantity = models.IntegerField()
     description = models.TextField()
     category = models.CharField(max_length=100)
     warranty = models.CharField(max_length=100, blank=True, null=True)
     image = models.ImageField(upload_to='product_images/', blank=True, null=True)
+    # The image name shop.images last wrote derivatives for. Derivative URLs
+    # are only handed out while it matches ``image``.
+    image_derivatives = models.CharField(max_length=100, blank=True, default='', editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    # What a customer actually pays per unit. Computed by the database so it
+    # can be indexed, sorted and filtered on, and always agrees with checkout.
+    # Legacy rows with a discount outside 0-100 are clamped rather than
+    # producing negative prices.
+    effective_price = models.GeneratedField(
+        expression=Round(
+            F('price') * (100 - Greatest(Least(F('discount'), 100), 0)) * Value(Decimal('0.01')), 2
+        ),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        db_persist=True,
+    )
+
+    # Review aggregates, maintained by shop.ratings; never edited directly.
+    rating_avg = models.FloatField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    stars_1 = models.PositiveIntegerField(default=0, editable=False)
+    stars_2 = models.PositiveIntegerField(default=0, editable=False)
+    stars_3 = models.PositiveIntegerField(default=0, editable=False)
+    stars_4 = models.PositiveIntegerField(default=0, editable=False)
+    stars_5 = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-rating_avg', '-rating_count', '-id'], name='product_rating_idx'),
+            models.Index(fields=['effective_price', 'id'], name='product_effective_price_idx'),
+            # Faceted filtering: category[, brand][, price range] and brand[, price range].
+            models.Index(fields=['category', 'brand', 'effective_price'], name='product_cat_brand_price_idx'),
+            models.Index(fields=['brand', 'effective_price'], name='product_brand_price_idx'),
+            models.Index(fields=['discount'], name='product_discount_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        updating = not self._state.adding
+        super().save(*args, **kwargs)
+        if updating:
+            # Recomputed by the database; reload it on next access.
+            self.__dict__.pop('effective_price', None)
+
+    def rating_histogram(self):
+        return {star: getattr(self, f'stars_{star}') for star in range(1, 6)}
+
     def discounted_price(self):
-        return self.price * (1 - self.discount / 100)
+        return self.effective_price
+
+class OrderQuerySet(models.QuerySet):
+    def with_details(self):
+        """Fetch users, items and item products in a fixed number of queries."""
+        return self.select_related('user').prefetch_related(
+            models.Prefetch('items', queryset=OrderItem.objects.select_related('product'))
+        )
+
+    def change_marker(self):
+        """
+        ``{'updated', 'newest', 'count'}`` for conditional GET on one user's
+        orders: any edit moves ``updated``, a new order ``newest``, a deletion
+        ``count``.
+        """
+        return self.order_by().aggregate(
+            updated=models.Max('updated_at'), newest=models.Max('id'), count=models.Count('id'),
+        )
 
 class Order(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -59,6 +127,20 @@ class Order(models.Model):
     payment_status = models.CharField(max_length=20, default='pending')
     order_status = models.CharField(max_length=20, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='order_created_id_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_created_id_idx'),
+            # Admin changelist filters.
+            models.Index(fields=['order_status', '-created_at', '-id'], name='order_status_created_id_idx'),
+            models.Index(fields=['payment_status', '-created_at', '-id'], name='order_payment_created_id_idx'),
+            # Conditional GET validators (OrderQuerySet.change_marker).
+            models.Index(fields=['user', 'updated_at'], name='order_user_updated_idx'),
+        ]
 
     def __str__(self):
         return f"Order #{self.id} by {self.user.email}"
@@ -78,6 +160,11 @@ class CartItem(models.Model):
     quantity = models.PositiveIntegerField(default=1)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'product'], name='cartitem_user_product_uniq'),
+        ]
+
     def __str__(self):
         return f"{self.user.email} → {self.product.name}"
 
@@ -99,18 +186,29 @@ class ChatMessage(models.Model):
     message = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['recipient', 'id'], name='chatmessage_recipient_id_idx'),
+            models.Index(fields=['sender', 'id'], name='chatmessage_sender_id_idx'),
+        ]
+
     def __str__(self):
         return f"{self.sender.email} ➜ {self.recipient.email}: {self.message[:30]}"
 
 class Review(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    rating = models.IntegerField()
+    rating = models.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)])
     comment = models.TextField()
     user_name = models.CharField(max_length=255, blank=True, null=True)
     anonymous = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', '-created_at', '-id'], name='review_product_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.product.name} - {self.rating} stars"
 
@@ -139,5 +237,41 @@ class Notification(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, null=True, blank=True)
     status = models.CharField(max_length=50, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'is_read', 'created_at'], name='notification_user_read_idx'),
+            models.Index(fields=['user', 'id'], name='notification_user_id_idx'),
+        ]
+
     def __str__(self):
         return f"Notification to {self.user.email}: {self.message[:30]}"
+
+class NotificationCounter(models.Model):
+    """Unread notification count per user, maintained by shop.notifications."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='notification_counter')
+    unread = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.unread} unread"
+
+class ProductSales(models.Model):
+    """Running sales totals per product, maintained by checkout (see shop.sales)."""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='sales')
+    quantity_sold = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=['-quantity_sold'], name='productsales_qty_idx')]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.quantity_sold} sold"
+
+class DailySales(models.Model):
+    """Running order and revenue totals per day, maintained by checkout (see shop.sales)."""
+    day = models.DateField(unique=True)
+    order_count = models.IntegerField(default=0)
+    quantity_sold = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.day}: {self.order_count} orders"
@@ -0,0 +1,79 @@
+from django.db import transaction
+from django.db.models import F
+
+from .caching import bump_version, get_version
+from .models import Notification, NotificationCounter
+
+FEED_LIMIT = 50
+FEED_VERSION_KEY = 'notifications:%s:version'
+
+
+def adjust_unread(user_id, delta):
+    """Add ``delta`` to a user's unread counter, creating the row if needed."""
+    if not delta:
+        return
+    if delta > 0:
+        NotificationCounter.objects.bulk_create(
+            [NotificationCounter(user_id=user_id)], ignore_conflicts=True
+        )
+    NotificationCounter.objects.filter(user_id=user_id).update(unread=F('unread') + delta)
+
+
+def unread_count(user):
+    count = NotificationCounter.objects.filter(user=user).values_list('unread', flat=True).first()
+    return max(count or 0, 0)
+
+
+def feed(user, after=None, limit=FEED_LIMIT):
+    """
+    Notifications for ``user`` as dicts.
+
+    Without ``after`` this is the newest ``limit`` entries, newest first.
+    With ``after`` it is only what arrived since that id, oldest first, so a
+    client can keep polling with the last id it has seen.
+    """
+    queryset = Notification.objects.filter(user=user)
+    if after is None:
+        queryset = queryset.order_by('-id')
+    else:
+        queryset = queryset.filter(id__gt=after).order_by('id')
+    return list(
+        queryset.values('id', 'message', 'created_at', 'is_read', 'order_id', 'status')[:limit]
+    )
+
+
+def feed_version(user):
+    """
+    Changes whenever ``feed()`` output for ``user`` may have: bumped for every
+    saved or deleted notification (shop.signals) and by mark_read. Used as the
+    feed's ETag, so revalidating costs a cache read and no query.
+    """
+    return get_version(FEED_VERSION_KEY % user.pk)
+
+
+def bump_feed_version(user_id):
+    key = FEED_VERSION_KEY % user_id
+    # Again on commit: a read before the commit could pair the old rows with
+    # the new version.
+    bump_version(key)
+    transaction.on_commit(lambda: bump_version(key))
+
+
+def mark_read(user, ids=None, up_to=None):
+    """
+    Mark unread notifications read with a single UPDATE.
+
+    ``ids`` limits it to those notifications, ``up_to`` to everything with
+    an id at or below it; with neither, everything is marked read.
+    """
+    queryset = Notification.objects.filter(user=user, is_read=False)
+    if ids is not None:
+        queryset = queryset.filter(id__in=ids)
+    if up_to is not None:
+        queryset = queryset.filter(id__lte=up_to)
+    with transaction.atomic():
+        updated = queryset.update(is_read=True)
+        adjust_unread(user.id, -updated)
+        if updated:
+            bump_feed_version(user.id)
+    return updated
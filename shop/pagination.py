@@ -0,0 +1,140 @@
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination, _reverse_ordering
+
+
+class ProductSearchPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    CursorPagination whose position is every ordering field, not just the first.
+
+    DRF keys the cursor on ``ordering[0]`` and steps over ties with an
+    offset, which skips or repeats rows when equal ``created_at`` values
+    straddle a page boundary. Ending the ordering on a unique field (id)
+    makes every position unique, so pages are exact and offsets stay 0.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        offset, reverse, current_position = self.cursor or (0, False, None)
+
+        queryset = queryset.order_by(*(_reverse_ordering(self.ordering) if reverse else self.ordering))
+        if current_position is not None:
+            queryset = queryset.filter(self.after(queryset.model, current_position, reverse))
+
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = results[:self.page_size]
+        following = self._get_position_from_instance(results[-1], self.ordering) if len(results) > len(self.page) else None
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None or offset > 0
+            self.has_previous = following is not None
+            self.next_position, self.previous_position = current_position, following
+        else:
+            self.has_next = following is not None
+            self.has_previous = current_position is not None or offset > 0
+            self.next_position, self.previous_position = following, current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def after(self, model, position, reverse):
+        """Rows past ``position`` in the (possibly reversed) ordering: a lexicographic keyset condition."""
+        try:
+            values = json.loads(position)
+            fields = [model._meta.get_field(name.lstrip('-')) for name in self.ordering]
+            if len(values) != len(fields):
+                raise ValueError
+            values = [field.to_python(value) for field, value in zip(fields, values)]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+        condition, equal = Q(), {}
+        for name, field, value in zip(self.ordering, fields, values):
+            lookup = 'lt' if name.startswith('-') != reverse else 'gt'
+            condition |= Q(**equal, **{f'{field.attname}__{lookup}': value})
+            equal[field.attname] = value
+        return condition
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for name in ordering:
+            name = name.lstrip('-')
+            value = instance[name] if isinstance(instance, dict) else getattr(instance, name)
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        return json.dumps(values, separators=(',', ':'))
+
+
+class OrderCursorPagination(KeysetCursorPagination):
+    """Keyset pagination over (created_at, id), newest first."""
+
+    ordering = ("-created_at", "-id")
+    page_size = 25
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
+class ReviewCursorPagination(KeysetCursorPagination):
+    """Keyset pagination over a product's reviews, newest first."""
+
+    ordering = ("-created_at", "-id")
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
+def estimated_row_count(model, using):
+    """Cheap row estimate for ``model``'s table, or None where there is none."""
+    connection = connections[using]
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [model._meta.db_table])
+        elif connection.vendor == "sqlite":
+            # Rowids only grow, so this is exact until rows get deleted.
+            cursor.execute(f"SELECT MAX(_ROWID_) FROM {table}")
+        else:
+            return None
+        row = cursor.fetchone()
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Admin changelist paginator that skips COUNT(*) over huge unfiltered tables.
+
+    Filtered changelists still count exactly; they go through an index.
+    """
+
+    estimate_above = 100_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if isinstance(queryset, QuerySet) and not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > self.estimate_above:
+                return estimate
+        return super().count
@@ -0,0 +1,61 @@
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Cast
+
+from .caching import bump_catalog_version
+from .models import Product, Review
+
+STARS = range(1, 6)
+RATING_FIELDS = ('rating_avg', 'rating_count', 'rating_sum') + tuple(f'stars_{star}' for star in STARS)
+
+
+def apply_review_change(product_id, old=None, new=None):
+    """
+    Move a product's rating aggregates from ``old`` to ``new``.
+
+    ``old`` is None for a new review, ``new`` is None for a deleted one.
+    Everything, the average included, is computed from the current row in a
+    single UPDATE, so concurrent reviews never overwrite each other.
+    """
+    count_delta = (new is not None) - (old is not None)
+    sum_delta = (new or 0) - (old or 0)
+    star_deltas = {}
+    for rating, delta in ((old, -1), (new, 1)):
+        if rating in STARS:
+            star_deltas[rating] = star_deltas.get(rating, 0) + delta
+
+    updates = {f'stars_{star}': F(f'stars_{star}') + delta for star, delta in star_deltas.items() if delta}
+    if not (count_delta or sum_delta or updates):
+        return
+
+    # The right-hand side of an UPDATE sees the row as it was before.
+    new_count = F('rating_count') + count_delta
+    new_sum = F('rating_sum') + sum_delta
+    updates.update(
+        rating_count=new_count,
+        rating_sum=new_sum,
+        rating_avg=Case(
+            When(rating_count__gt=-count_delta, then=Cast(new_sum, FloatField()) / new_count),
+            default=Value(0.0),
+            output_field=FloatField(),
+        ),
+    )
+    Product.objects.filter(pk=product_id).update(**updates)
+    # queryset.update() skips Product signals, so invalidate the catalog here.
+    bump_catalog_version()
+    transaction.on_commit(bump_catalog_version)
+
+
+def expected_ratings():
+    """{product_id: {field: value}} recomputed from the reviews themselves."""
+    rows = Review.objects.values('product_id').annotate(
+        rating_count=Count('id'),
+        rating_sum=Sum('rating'),
+        **{f'stars_{star}': Count('id', filter=Q(rating=star)) for star in STARS},
+    )
+    expected = {}
+    for row in rows:
+        product_id = row.pop('product_id')
+        row['rating_avg'] = row['rating_sum'] / row['rating_count']
+        expected[product_id] = row
+    return expected
@@ -0,0 +1,27 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer backed by orjson when it is installed.
+
+    Output is compact UTF-8 like DRF's default. Anything orjson can't encode
+    natively (Decimal, lazy strings, querysets...) goes through DRF's
+    JSONEncoder. Requests asking for indented output (``; indent=4``) and
+    installs without orjson fall back to the stock renderer.
+    """
+
+    options = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        return orjson.dumps(data, default=JSONEncoder().default, option=self.options)
@@ -0,0 +1,139 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Case, Count, DecimalField, F, IntegerField, Sum, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailySales, Order, OrderItem, ProductSales
+
+CANCELLED = 'cancelled'
+
+
+def is_counted(order_status):
+    return order_status != CANCELLED
+
+
+def apply_lines(order, lines, sign=1):
+    """
+    Add (``sign=1``) or remove (``sign=-1``) order lines from the rollups:
+    per-product quantity and revenue and the quantity of the order's day.
+
+    ``lines`` is an iterable of objects or dicts with ``product_id``,
+    ``quantity`` and ``price``. Must run inside the transaction that changes
+    them so the rollups never drift from ``OrderItem``.
+    """
+    per_product = defaultdict(lambda: [0, Decimal('0')])
+    for line in lines:
+        if isinstance(line, dict):
+            product_id, quantity, price = line['product_id'], line['quantity'], line['price']
+        else:
+            product_id, quantity, price = line.product_id, line.quantity, line.price
+        per_product[product_id][0] += quantity
+        per_product[product_id][1] += price * quantity
+    if not per_product:
+        return
+
+    if sign > 0:
+        # Not when removing: the rows exist, unless the product itself is
+        # being deleted along with its lines.
+        ProductSales.objects.bulk_create(
+            [ProductSales(product_id=pk) for pk in per_product], ignore_conflicts=True
+        )
+    ProductSales.objects.filter(product_id__in=list(per_product)).update(
+        quantity_sold=Case(
+            *[When(product_id=pk, then=F('quantity_sold') + sign * qty) for pk, (qty, _) in per_product.items()],
+            output_field=IntegerField(),
+        ),
+        revenue=Case(
+            *[When(product_id=pk, then=F('revenue') + sign * rev) for pk, (_, rev) in per_product.items()],
+            output_field=DecimalField(max_digits=14, decimal_places=2),
+        ),
+    )
+    update_day(order, quantity_sold=sign * sum(qty for qty, _ in per_product.values()))
+
+
+def apply_order_total(order, sign=1):
+    """Add or remove the order itself from its day: the order count and its total."""
+    update_day(order, order_count=sign, revenue=sign * order.total_price)
+
+
+def update_day(order, **deltas):
+    day = timezone.localdate(order.created_at)
+    DailySales.objects.bulk_create([DailySales(day=day)], ignore_conflicts=True)
+    DailySales.objects.filter(day=day).update(**{name: F(name) + delta for name, delta in deltas.items()})
+
+
+def order_lines(order):
+    return order.items.values('product_id', 'quantity', 'price')
+
+
+# What an order contributes is split in two, each kept up to date by
+# shop.signals however the rows change (checkout, API, admin, scripts): the
+# order row counts once with its total, and every OrderItem adds its own
+# quantity and revenue. Both only while the order is not cancelled.
+
+def add_order(order):
+    """A newly created order, before any of its lines."""
+    if is_counted(order.order_status):
+        apply_order_total(order)
+
+
+def apply_order_change(order, old_status, old_total):
+    """
+    Keep the rollups in step with a saved edit to ``order``: a new total on
+    a counted order moves its day's revenue, then a status change adds or
+    removes the order and its lines (at its new total).
+    """
+    was_counted, now_counted = is_counted(old_status), is_counted(order.order_status)
+    if was_counted and old_total != order.total_price:
+        update_day(order, revenue=order.total_price - old_total)
+    if was_counted != now_counted:
+        sign = 1 if now_counted else -1
+        apply_order_total(order, sign)
+        apply_lines(order, order_lines(order), sign)
+
+
+def remove_order(order):
+    """
+    Take a deleted order's own share out of the rollups. Its lines are
+    deleted along with it and take theirs out themselves.
+    """
+    if is_counted(order.order_status):
+        apply_order_total(order, sign=-1)
+
+
+def apply_line_change(line, sign=1):
+    """
+    Add (saved, ``sign=1``) or remove (deleted, ``sign=-1``) one OrderItem,
+    given as an object or a dict of its values, if its order is counted.
+    """
+    order_id = line['order_id'] if isinstance(line, dict) else line.order_id
+    order = Order.objects.filter(pk=order_id).only('order_status', 'created_at').first()
+    if order is not None and is_counted(order.order_status):
+        apply_lines(order, [line], sign)
+
+
+def expected_rollups():
+    """Recompute both rollups from order history: ``(per_product, per_day)``."""
+    counted_items = OrderItem.objects.exclude(order__order_status=CANCELLED)
+    per_product = {
+        row['product_id']: (row['quantity_sold'], row['revenue'])
+        for row in counted_items.values('product_id').annotate(
+            quantity_sold=Sum('quantity'),
+            revenue=Sum(F('price') * F('quantity'), output_field=DecimalField(max_digits=14, decimal_places=2)),
+        )
+    }
+
+    counted_orders = Order.objects.exclude(order_status=CANCELLED).annotate(day=TruncDate('created_at'))
+    per_day = {
+        row['day']: [row['order_count'], 0, row['revenue']]
+        for row in counted_orders.values('day').annotate(order_count=Count('id'), revenue=Sum('total_price'))
+    }
+    day_quantities = (
+        counted_items.annotate(day=TruncDate('order__created_at'))
+        .values('day').annotate(quantity_sold=Sum('quantity'))
+    )
+    for row in day_quantities:
+        per_day[row['day']][1] = row['quantity_sold']
+    return per_product, {day: tuple(values) for day, values in per_day.items()}
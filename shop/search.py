@@ -0,0 +1,145 @@
+import re
+
+from django.db import connection, connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import BaseFilterBackend
+
+# Extra words past this add cost but rarely change the result set.
+MAX_TERMS = 8
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(query):
+    """Split a raw search string into lowercase word tokens."""
+    return [t.lower() for t in TOKEN_RE.findall(query or "")][:MAX_TERMS]
+
+
+# Same triggers as migration 0020. SQLite drops them whenever a migration has
+# to rebuild shop_product, so post_migrate puts back any that went missing.
+SQLITE_TRIGGERS = {
+    "shop_product_fts_ai": """
+        CREATE TRIGGER IF NOT EXISTS shop_product_fts_ai AFTER INSERT ON shop_product BEGIN
+            INSERT INTO shop_product_fts(rowid, name, brand, description)
+            VALUES (new.id, new.name, new.brand, new.description);
+        END
+    """,
+    "shop_product_fts_ad": """
+        CREATE TRIGGER IF NOT EXISTS shop_product_fts_ad AFTER DELETE ON shop_product BEGIN
+            INSERT INTO shop_product_fts(shop_product_fts, rowid, name, brand, description)
+            VALUES ('delete', old.id, old.name, old.brand, old.description);
+        END
+    """,
+    "shop_product_fts_au": """
+        CREATE TRIGGER IF NOT EXISTS shop_product_fts_au AFTER UPDATE OF name, brand, description ON shop_product BEGIN
+            INSERT INTO shop_product_fts(shop_product_fts, rowid, name, brand, description)
+            VALUES ('delete', old.id, old.name, old.brand, old.description);
+            INSERT INTO shop_product_fts(rowid, name, brand, description)
+            VALUES (new.id, new.name, new.brand, new.description);
+        END
+    """,
+}
+
+
+def repair_sqlite_index(using="default"):
+    """Recreate missing FTS triggers and rebuild the index if any were missing."""
+    conn = connections[using]
+    if conn.vendor != "sqlite":
+        return
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'shop_product_fts'")
+        if cursor.fetchone() is None:
+            return
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'shop_product'")
+        existing = {row[0] for row in cursor.fetchall()}
+        missing = [name for name in SQLITE_TRIGGERS if name not in existing]
+        for name in missing:
+            cursor.execute(SQLITE_TRIGGERS[name])
+        if missing:
+            cursor.execute("INSERT INTO shop_product_fts(shop_product_fts) VALUES ('rebuild')")
+
+
+class SQLiteSearchBackend:
+    """FTS5 index in ``shop_product_fts`` kept in sync by triggers (see migration 0020)."""
+
+    # bm25 column weights for name, brand, description.
+    rank_sql = "bm25(shop_product_fts, 10.0, 5.0, 1.0)"
+
+    def build_query(self, terms):
+        # Every term is quoted (so FTS operators in user input are inert) and
+        # prefix-matched, e.g. 'sams gal' -> "sams"* AND "gal"*.
+        return " AND ".join('"%s"*' % t.replace('"', '""') for t in terms)
+
+    def search(self, queryset, terms):
+        expr = self.build_query(terms)
+        matches = RawSQL(
+            "SELECT rowid FROM shop_product_fts WHERE shop_product_fts MATCH %s", (expr,)
+        )
+        rank = RawSQL(
+            "SELECT " + self.rank_sql + " FROM shop_product_fts"
+            " WHERE shop_product_fts MATCH %s AND rowid = shop_product.id",
+            (expr,),
+        )
+        # bm25 is lower-is-better.
+        return queryset.filter(pk__in=matches).annotate(search_rank=rank).order_by("search_rank", "-id")
+
+
+class PostgreSQLSearchBackend:
+    """Generated ``shop_product.search_vector`` column with a GIN index (see migration 0020)."""
+
+    def build_query(self, terms):
+        return " & ".join("%s:*" % t for t in terms)
+
+    def search(self, queryset, terms):
+        expr = self.build_query(terms)
+        matches = RawSQL(
+            "SELECT id FROM shop_product WHERE search_vector @@ to_tsquery('simple', %s)", (expr,)
+        )
+        rank = RawSQL(
+            "ts_rank(shop_product.search_vector, to_tsquery('simple', %s))", (expr,)
+        )
+        # ts_rank is higher-is-better.
+        return queryset.filter(pk__in=matches).annotate(search_rank=rank).order_by("-search_rank", "-id")
+
+
+class FallbackSearchBackend:
+    """Unindexed icontains search for database vendors without a full-text index."""
+
+    fields = ("name", "brand", "description")
+
+    def search(self, queryset, terms):
+        for term in terms:
+            condition = Q()
+            for field in self.fields:
+                condition |= Q(**{f"{field}__icontains": term})
+            queryset = queryset.filter(condition)
+        return queryset.order_by("-id")
+
+
+BACKENDS = {
+    "sqlite": SQLiteSearchBackend,
+    "postgresql": PostgreSQLSearchBackend,
+}
+
+
+def get_search_backend():
+    return BACKENDS.get(connection.vendor, FallbackSearchBackend)()
+
+
+def search_products(queryset, query):
+    """Filter ``queryset`` to products matching ``query``, best matches first."""
+    terms = tokenize(query)
+    if not terms:
+        return queryset
+    return get_search_backend().search(queryset, terms)
+
+
+class FullTextSearchFilter(BaseFilterBackend):
+    """Drop-in replacement for ``SearchFilter`` on ``Product`` querysets."""
+
+    search_param = "search"
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, "")
+        return search_products(queryset, query)
@@ -1,3 +1,4 @@
+from django.db.models import Prefetch
 from rest_framework import serializers
 from .models import Product, Order, OrderItem, CartItem, ShippingAddress, Review
 from django.contrib.auth import get_user_model
@@ -5,21 +6,110 @@ from shop.models import ChatMessage
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
+from .checkout import MAX_QUANTITY
+from .images import VARIANTS, derivative_url, derivative_urls
+from .fieldsets import Expansion, SparseFieldsetMixin
+from .lean import LeanSerializer, absolute_url
+from .pagination import OrderCursorPagination
+from .ratings import STARS
 
 User = get_user_model()
 
+
+# Derivative URL helpers take the product's image name and its
+# image_derivatives; until those match they point at the original image.
+def image_variants(request, name, ready_for):
+    if not name:
+        return None
+    return {
+        variant: {ext: absolute_url(request, url) for ext, url in urls.items()}
+        for variant, urls in derivative_urls(name, ready_for).items()
+    }
+
+
+def image_srcset(request, name, ready_for):
+    if not name:
+        return None
+    if ready_for != name:
+        return product_image_url(request, name)
+    return ", ".join(
+        f"{absolute_url(request, derivative_url(name, ready_for, variant))} {size}w"
+        for variant, size in VARIANTS.items()
+    )
+
+
+def product_image_url(request, name):
+    if not name:
+        return None
+    return absolute_url(request, Product._meta.get_field('image').storage.url(name))
+
+
+def product_thumbnail_url(request, name, ready_for):
+    if not name:
+        return None
+    return absolute_url(request, derivative_url(name, ready_for, 'thumbnail'))
+
+
 # ✅ Product Serializer (already used in Home.jsx)
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    image_variants = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
+    thumbnail = serializers.SerializerMethodField()
+    rating_histogram = serializers.SerializerMethodField()
+    effective_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = Product
+        exclude = ['image_derivatives']  # bookkeeping; shows in the URLs below
+
+    def get_image_variants(self, obj):
+        return image_variants(self.context.get('request'), obj.image.name, obj.image_derivatives)
+
+    def get_image_srcset(self, obj):
+        return image_srcset(self.context.get('request'), obj.image.name, obj.image_derivatives)
+
+    def get_thumbnail(self, obj):
+        return product_thumbnail_url(self.context.get('request'), obj.image.name, obj.image_derivatives)
+
+    def get_rating_histogram(self, obj):
+        return obj.rating_histogram()
+
+
+class ProductImportSerializer(serializers.ModelSerializer):
+    """One row of a bulk import (see shop.imports); ``image`` is a local file path."""
+    image = serializers.CharField(required=False, allow_blank=True)
+
     class Meta:
         model = Product
-        fields = '__all__'  # or include 'image' in the fields list
+        fields = ['sku', 'name', 'brand', 'price', 'discount', 'quantity', 'description', 'category', 'warranty', 'image']
+        # Uniqueness is what the import upserts on, not an error; checking
+        # it per row would also cost a query each.
+        extra_kwargs = {'sku': {'required': True, 'allow_null': False, 'validators': []}}
 
 
 # ✅ Cart Item Serializer
-class CartItemSerializer(serializers.ModelSerializer):
+class CartItemSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = CartItem
         fields = '__all__'
+        # Adding a product that is already in the cart increments it (see
+        # shop.cart.add_items) instead of failing the unique check.
+        validators = []
+        extra_kwargs = {'quantity': {'max_value': MAX_QUANTITY}}
+        expandable = {
+            'product': Expansion(expanded=ProductSerializer(read_only=True), load=['product']),
+        }
+
+    def validate(self, attrs):
+        # Updates are not upserts: moving a line onto a product the cart
+        # already holds would break cartitem_user_product_uniq.
+        if self.instance is not None:
+            user = attrs.get('user', self.instance.user)
+            product = attrs.get('product', self.instance.product)
+            duplicate = CartItem.objects.filter(user=user, product=product).exclude(pk=self.instance.pk)
+            if duplicate.exists():
+                raise serializers.ValidationError({'product': 'This product is already in the cart.'})
+        return attrs
 
 
 # ✅ Shipping Address Serializer
@@ -33,19 +123,19 @@ class ShippingAddressSerializer(serializers.ModelSerializer):
 class OrderItemSerializer(serializers.ModelSerializer):
     name = serializers.CharField(source="product.name", read_only=True)
     image = serializers.SerializerMethodField()
+    thumbnail = serializers.SerializerMethodField()
 
     class Meta:
         model = OrderItem
-        fields = ["id", "product", "name", "quantity", "price", "image"]
+        fields = ["id", "product", "name", "quantity", "price", "image", "thumbnail"]
 
     def get_image(self, obj):
-        request = self.context.get('request')
-        if obj.product and obj.product.image:
-            image_url = obj.product.image.url
-            if request is not None:
-                return request.build_absolute_uri(image_url)
-            return image_url
-        return None
+        return product_image_url(self.context.get('request'), obj.product.image.name if obj.product else None)
+
+    def get_thumbnail(self, obj):
+        if not obj.product:
+            return None
+        return product_thumbnail_url(self.context.get('request'), obj.product.image.name, obj.product.image_derivatives)
 
 class UserSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True, validators=[validate_password])
@@ -124,6 +214,7 @@ class ChatMessageSerializer(serializers.ModelSerializer):
     class Meta:
         model = ChatMessage
         fields = ['id', 'sender', 'recipient', 'message', 'timestamp', 'sender_name', 'recipient_name']
+        read_only_fields = ['sender']
 
 class ReviewSerializer(serializers.ModelSerializer):
     class Meta:
@@ -137,7 +228,7 @@ class CustomerSerializer(serializers.ModelSerializer):
         fields = ('full_name', 'email', 'contact', 'address')
 
 # ✅ Order Serializer
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     items = OrderItemSerializer(many=True, read_only=True)
     date = serializers.DateTimeField(source='created_at', format="%m/%d/%Y, %I:%M:%S %p", read_only=True)
@@ -148,9 +239,45 @@ class OrderSerializer(serializers.ModelSerializer):
             'id', 'user', 'total_price', 'payment_method', 'payment_status', 'order_status',
             'date', 'items'
         ]
+        # With ?fields=/?expand=, user and items are ids unless expanded.
+        expandable = {
+            'user': Expansion(collapsed=serializers.PrimaryKeyRelatedField(read_only=True), load=['user']),
+            'items': Expansion(
+                collapsed=serializers.PrimaryKeyRelatedField(many=True, read_only=True),
+                load=[Prefetch('items', queryset=OrderItem.objects.select_related('product'))],
+                load_collapsed=[Prefetch('items', queryset=OrderItem.objects.only('id', 'order'))],
+            ),
+        }
+        always_load = OrderCursorPagination.ordering
 
 class MostSellingProductSerializer(serializers.Serializer):
     product = serializers.IntegerField()
     name = serializers.CharField()
     image = serializers.CharField()
-    quantity_sold = serializers.IntegerField()
\ No newline at end of file
+    quantity_sold = serializers.IntegerField()
+
+# Lean read paths (see shop.lean): same output as the serializers above, built
+# straight from values_list() rows for large read-only lists.
+class ProductLeanSerializer(LeanSerializer):
+    serializer_class = ProductSerializer
+    computed = {
+        'image_variants': (['image', 'image_derivatives'], image_variants),
+        'image_srcset': (['image', 'image_derivatives'], image_srcset),
+        'thumbnail': (['image', 'image_derivatives'], product_thumbnail_url),
+        'rating_histogram': (
+            [f'stars_{star}' for star in STARS],
+            lambda request, *counts: dict(zip(STARS, counts)),
+        ),
+    }
+
+
+class OrderItemLeanSerializer(LeanSerializer):
+    serializer_class = OrderItemSerializer
+    computed = {
+        'image': (['product__image'], product_image_url),
+        'thumbnail': (['product__image', 'product__image_derivatives'], product_thumbnail_url),
+    }
+
+
+class UserLeanSerializer(LeanSerializer):
+    serializer_class = UserSerializer
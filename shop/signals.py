@@ -1,7 +1,187 @@
-from django.db.models.signals import post_migrate
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_migrate, pre_delete, pre_save, post_save, post_delete
 from django.dispatch import receiver
 from django.core.management import call_command
 
+from .authentication import invalidate_cached_user
+from .caching import bump_catalog_version, bump_orders_version
+from .images import schedule_derivatives
+from .chat import publish_message
+from .models import ChatMessage, Notification, Order, OrderItem, Product, Review, User
+from .notifications import adjust_unread, bump_feed_version
+from .ratings import apply_review_change
+from .search import repair_sqlite_index
+from . import sales
+from .sqlite import configure_connection
+
 @receiver(post_migrate)
 def create_default_admin(sender, **kwargs):
-    call_command('create_admin_user')
\ No newline at end of file
+    call_command('create_admin_user')
+
+@receiver(post_migrate)
+def repair_search_index(sender, using='default', **kwargs):
+    if sender.name == 'shop':
+        repair_sqlite_index(using)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_catalog_cache(sender, **kwargs):
+    # Bump again on commit: a read between now and the commit could have
+    # cached the old rows under the new version.
+    bump_catalog_version()
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_cache(sender, instance, **kwargs):
+    invalidate_cached_user(instance.pk)
+    transaction.on_commit(lambda: invalidate_cached_user(instance.pk))
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_order_lists(sender, update_fields=None, **kwargs):
+    # Order lists embed their lines and users. A login only touches
+    # last_login, which no order list shows.
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    bump_orders_version()
+    transaction.on_commit(bump_orders_version)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def invalidate_user_permissions(sender, instance, reverse, pk_set, action, **kwargs):
+    if reverse and action == 'pre_clear':
+        # group.user_set.clear() sends no pk_set, so note the members first.
+        instance._cleared_user_ids = list(
+            sender.objects.filter(**{instance._meta.model_name: instance.pk}).values_list('user_id', flat=True)
+        )
+        return
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        user_ids = [instance.pk]
+    elif action == 'post_clear':
+        user_ids = instance.__dict__.pop('_cleared_user_ids', ())
+    else:
+        user_ids = pk_set
+    for user_id in user_ids:
+        invalidate_cached_user(user_id)
+
+
+@receiver(post_save, sender=Product)
+def queue_image_derivatives(sender, instance, update_fields=None, **kwargs):
+    if not instance.image:
+        return
+    if update_fields is not None and 'image' not in update_fields:
+        return
+    name = instance.image.name
+    transaction.on_commit(lambda: schedule_derivatives(name))
+
+
+@receiver(post_save, sender=ChatMessage)
+def push_chat_message(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: publish_message(instance))
+
+
+@receiver(post_save, sender=Notification)
+def count_new_notification(sender, instance, created, **kwargs):
+    if created and not instance.is_read:
+        adjust_unread(instance.user_id, 1)
+
+
+@receiver(post_delete, sender=Notification)
+def uncount_deleted_notification(sender, instance, **kwargs):
+    if not instance.is_read:
+        adjust_unread(instance.user_id, -1)
+
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def invalidate_notification_feed(sender, instance, **kwargs):
+    bump_feed_version(instance.user_id)
+
+
+@receiver(pre_save, sender=Review)
+def remember_previous_rating(sender, instance, **kwargs):
+    instance._previous_rating = None
+    if not instance._state.adding:
+        instance._previous_rating = (
+            Review.objects.filter(pk=instance.pk).values_list('product_id', 'rating').first()
+        )
+
+
+@receiver(post_save, sender=Review)
+def update_rating_on_save(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_rating', None)
+    if previous is None:
+        apply_review_change(instance.product_id, new=instance.rating)
+    elif previous[0] != instance.product_id:
+        apply_review_change(previous[0], old=previous[1])
+        apply_review_change(instance.product_id, new=instance.rating)
+    elif previous[1] != instance.rating:
+        apply_review_change(instance.product_id, old=previous[1], new=instance.rating)
+
+
+@receiver(post_delete, sender=Review)
+def update_rating_on_delete(sender, instance, **kwargs):
+    apply_review_change(instance.product_id, old=instance.rating)
+
+
+@receiver(pre_save, sender=Order)
+def remember_previous_order_state(sender, instance, **kwargs):
+    instance._previous_sales_state = None
+    if not instance._state.adding:
+        instance._previous_sales_state = (
+            Order.objects.filter(pk=instance.pk).values_list('order_status', 'total_price').first()
+        )
+
+
+@receiver(post_save, sender=Order)
+def update_sales_on_order_change(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_sales_state', None)
+    if created:
+        sales.add_order(instance)
+    elif previous is not None:
+        sales.apply_order_change(instance, *previous)
+
+
+@receiver(pre_delete, sender=Order)
+def update_sales_on_order_delete(sender, instance, **kwargs):
+    sales.remove_order(instance)
+
+
+@receiver(pre_save, sender=OrderItem)
+def remember_previous_order_line(sender, instance, **kwargs):
+    instance._previous_sales_line = None
+    if not instance._state.adding:
+        instance._previous_sales_line = (
+            OrderItem.objects.filter(pk=instance.pk).values('order_id', 'product_id', 'quantity', 'price').first()
+        )
+
+
+@receiver(post_save, sender=OrderItem)
+def update_sales_on_order_line_change(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_sales_line', None)
+    if previous is not None:
+        sales.apply_line_change(previous, sign=-1)
+    sales.apply_line_change(instance)
+
+
+@receiver(post_delete, sender=OrderItem)
+def update_sales_on_order_line_delete(sender, instance, **kwargs):
+    sales.apply_line_change(instance, sign=-1)
+
+
+@receiver(connection_created)
+def tune_sqlite_connection(sender, connection, **kwargs):
+    configure_connection(connection)
@@ -0,0 +1,36 @@
+from django.conf import settings
+
+# Applied to every new SQLite connection when SQLITE_HIGH_CONCURRENCY is on.
+PRAGMAS = (
+    # Readers no longer block the writer and vice versa.
+    'PRAGMA journal_mode=WAL',
+    # Durable across application crashes; only an OS crash can lose the
+    # last transactions, which is the usual trade-off with WAL.
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA mmap_size=268435456',
+    # Negative means KiB: 64 MiB page cache per connection.
+    'PRAGMA cache_size=-65536',
+    'PRAGMA temp_store=MEMORY',
+)
+
+# sqlite3.connect()'s own default, used when OPTIONS has no ``timeout``.
+DEFAULT_TIMEOUT = 5.0
+
+
+def busy_timeout_pragma(connection):
+    """
+    Wait for a lock instead of failing with "database is locked", for as long
+    as the database's ``OPTIONS['timeout']`` says (in seconds), so settings
+    stay the one place the timeout is configured.
+    """
+    timeout = connection.settings_dict.get('OPTIONS', {}).get('timeout', DEFAULT_TIMEOUT)
+    return f'PRAGMA busy_timeout={int(timeout * 1000)}'
+
+
+def configure_connection(connection):
+    """Apply PRAGMAS to a freshly opened SQLite connection."""
+    if connection.vendor != 'sqlite' or not getattr(settings, 'SQLITE_HIGH_CONCURRENCY', False):
+        return
+    with connection.cursor() as cursor:
+        for pragma in (*PRAGMAS, busy_timeout_pragma(connection)):
+            cursor.execute(pragma)
@@ -0,0 +1,55 @@
+import hashlib
+import posixpath
+import re
+
+from django.core.files.storage import FileSystemStorage
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+from .images import DERIVATIVES_DIR
+
+# ``phone.3f2a9c1b7d4e.webp`` and its ``phone.3f2a9c1b7d4e_card.webp`` derivatives.
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}(_[a-z]+)?\.[A-Za-z0-9]+$')
+
+
+def content_hash(content):
+    hasher = hashlib.md5(usedforsecurity=False)
+    for chunk in content.chunks():
+        hasher.update(chunk)
+    content.seek(0)
+    return hasher.hexdigest()[:12]
+
+
+class HashedMediaStorage(FileSystemStorage):
+    """
+    Media storage that puts a hash of the content in every upload's name
+    (``phone.webp`` -> ``phone.3f2a9c1b7d4e.webp``), so a media URL always
+    means the same bytes and can be cached forever. Saving content that is
+    already stored returns the existing name instead of a copy.
+
+    Image derivatives are written under the name they are given: it is built
+    from an already hashed original (shop.images.derivative_name).
+    """
+
+    def save(self, name, content, max_length=None):
+        directory, filename = posixpath.split(str(name).replace('\\', '/'))
+        if posixpath.basename(directory) != DERIVATIVES_DIR and not HASHED_NAME.search(filename):
+            stem, ext = posixpath.splitext(filename)
+            name = posixpath.join(directory, f'{stem}.{content_hash(content)}{ext}')
+            if self.exists(name):
+                return name
+        return super().save(name, content, max_length)
+
+
+class StaticStorage(CompressedManifestStaticFilesStorage):
+    """
+    Content-hashed static files with gzip/brotli copies, written by
+    collectstatic. Before collectstatic has run (development, tests) there is
+    no manifest, and URLs stay unhashed instead of raising.
+    """
+
+    manifest_strict = False
+
+    def stored_name(self, name):
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
@@ -1,3 +1,1036 @@
-from django.test import TestCase
+import contextlib
+import csv
+import gzip
+import io
+import json
+import shutil
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from unittest import mock
+from urllib.parse import urlsplit
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import Group, Permission, update_last_login
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .images import generate_derivatives, schedule_derivatives
+from .imports import ProductImporter, read_rows
+from . import chat, checkout, db_router
+from .authentication import get_user_version
+from .caching import cached_catalog_response
+from .db_router import PrimaryReplicaRouter, ReplicaPinningMiddleware
+from .models import (
+    User, Product, Order, OrderItem, Review, CartItem, ChatMessage, DailySales, Notification,
+    NotificationCounter, ProductSales,
+)
+from .pagination import EstimatedCountPaginator
+from .renderers import FastJSONRenderer
+from .search import repair_sqlite_index
+from .serializers import (
+    CartItemSerializer, OrderItemLeanSerializer, OrderItemSerializer, ProductLeanSerializer, ProductSerializer,
+    UserLeanSerializer, UserSerializer,
+)
+
+
+def make_user(email, **extra):
+    return User.objects.create_user(
+        email=email, full_name='Test User', contact='9800000000',
+        address='Kathmandu', password='pass12345', **extra
+    )
+
+
+def make_product(**fields):
+    data = {
+        'name': 'Galaxy S8', 'brand': 'Samsung', 'price': Decimal('500.00'),
+        'discount': 0, 'quantity': 10, 'description': 'Phone', 'category': 'phone',
+    }
+    data.update(fields)
+    return Product.objects.create(**data)
+
+
+def use_temporary_media(test):
+    media_root = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, media_root)
+    settings = override_settings(MEDIA_ROOT=media_root)
+    settings.enable()
+    test.addCleanup(settings.disable)
+
+
+class ProductSearchTests(TestCase):
+    def search(self, query):
+        response = APIClient().get('/api/products/search/', {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return [p['id'] for p in response.json()['results']]
+
+    def test_index_follows_product_changes(self):
+        phone = make_product(name='Galaxy S8', description='Phone')
+        case = make_product(name='Galaxy case', brand='Spigen', description='Cover')
+        self.assertCountEqual(self.search('gal'), [phone.id, case.id])
+        self.assertEqual(self.search('samsung galaxy'), [phone.id])
+
+        phone.name = 'Pixel 7'
+        phone.save()
+        self.assertEqual(self.search('galaxy'), [case.id])
+        self.assertEqual(self.search('pixel'), [phone.id])
+        case.delete()
+        self.assertEqual(self.search('galaxy'), [])
+        # FTS syntax in user input is matched literally, not parsed.
+        self.assertEqual(self.search('pixel OR "'), [])
+
+    def test_repair_restores_dropped_triggers(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER shop_product_fts_ai')
+        missed = make_product(name='Nokia 3310')
+        self.assertEqual(self.search('nokia'), [])
+
+        repair_sqlite_index()
+        self.assertEqual(self.search('nokia'), [missed.id])
+        self.assertEqual(self.search('moto'), [])
+        moto = make_product(name='Moto G')
+        self.assertEqual(self.search('moto'), [moto.id])
+
+
+class OrderHistoryTests(TestCase):
+    def setUp(self):
+        self.staff = make_user('staff@example.com', is_staff=True)
+        self.customer = make_user('customer@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def add_orders(self, count):
+        for _ in range(count):
+            order = Order.objects.create(user=self.customer, total_price=Decimal('1000.00'))
+            for _ in range(3):
+                OrderItem.objects.create(
+                    order=order, product=make_product(), quantity=1, price=Decimal('500.00')
+                )
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response.json()
+
+    def test_query_count_does_not_grow_with_orders(self):
+        for url in ('/api/orders/', '/api/orders/?page_size=100'):
+            self.add_orders(2)
+            few, _ = self.count_queries(url)
+            self.add_orders(8)
+            many, data = self.count_queries(url)
+            self.assertEqual(few, many)
+            self.assertEqual(len(data['results'][0]['items']), 3)
+
+    def test_cursor_walks_all_orders_once(self):
+        self.add_orders(5)
+        # Ties on created_at straddling page boundaries.
+        Order.objects.filter(id__in=Order.objects.order_by('id').values('id')[1:4]).update(created_at=timezone.now())
+        expected = list(Order.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        seen = []
+        url = '/api/orders/?page_size=2'
+        while url:
+            _, data = self.count_queries(url)
+            seen.extend(order['id'] for order in data['results'])
+            url = data['next']
+            if len(seen) == 2:
+                # Rows going away behind the cursor must not shift it.
+                Order.objects.filter(id=seen[0]).delete()
+        self.assertEqual(seen, expected)
+        expected.remove(seen[0])
+
+        backwards = []
+        while data['previous']:
+            _, data = self.count_queries(data['previous'])
+            backwards = [order['id'] for order in data['results']] + backwards
+        self.assertEqual(backwards, expected[:len(backwards)])
+        self.assertEqual(len(backwards), 3)
+
+    def test_product_pages_are_stable_without_ordering(self):
+        ids = [make_product().id for _ in range(5)]
+        client = APIClient()
+        pages = [client.get('/api/products/search/', {'page_size': 2, 'page': n}).json()['results'] for n in (1, 2, 3)]
+        self.assertEqual([p['id'] for page in pages for p in page], ids)
+
+    def test_customer_sees_only_own_orders(self):
+        self.add_orders(1)
+        Order.objects.create(user=self.staff, total_price=Decimal('1.00'))
+        self.client.force_authenticate(self.customer)
+        _, data = self.count_queries('/api/orders/')
+        self.assertEqual([o['user']['id'] for o in data['results']], [self.customer.id])
+
+    def test_customer_cannot_change_own_orders(self):
+        order = Order.objects.create(user=self.customer, total_price=Decimal('10.00'))
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get(f'/api/orders/{order.id}/').status_code, 200)
+        response = self.client.patch(
+            f'/api/orders/{order.id}/', {'payment_status': 'paid', 'total_price': '0.01'}, format='json'
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.client.delete(f'/api/orders/{order.id}/').status_code, 403)
+        order.refresh_from_db()
+        self.assertEqual((order.payment_status, order.total_price), ('pending', Decimal('10.00')))
+
+        self.client.force_authenticate(self.staff)
+        self.assertEqual(self.client.patch(f'/api/orders/{order.id}/', {'payment_status': 'paid'}).status_code, 200)
+
+
+class RequestMetricsTests(TestCase):
+    def test_disabled_by_default(self):
+        make_product()
+        self.assertFalse(APIClient().get('/api/products/').has_header('Server-Timing'))
+
+    @override_settings(REQUEST_METRICS_ENABLED=True, REQUEST_METRICS_SLOW_MS=0)
+    def test_reports_timing_and_logs_slow_requests(self):
+        make_product()
+        with self.assertLogs('shop.metrics', 'WARNING') as logs:
+            response = APIClient().get('/api/products/', {'category': 'phone', 'token': 'secret'})
+        self.assertRegex(
+            response['Server-Timing'],
+            r'^db;dur=[0-9.]+;desc="[1-9][0-9]* queries", serialize;dur=[0-9.]+, total;dur=[0-9.]+$',
+        )
+
+        entry = logs.records[0].request_metrics
+        self.assertEqual(
+            (entry['method'], entry['path'], entry['status']), ('GET', '/api/products/?category=phone', 200)
+        )
+        self.assertGreater(entry['queries'], 0)
+        self.assertTrue(entry['top_queries'][0]['sql'].startswith('SELECT'))
+        self.assertNotIn('secret', logs.output[0])
+
+
+class CachedAuthenticationTests(TestCase):
+    def setUp(self):
+        self.staff = make_user('staff@example.com', is_staff=True)
+        self.customer = make_user('customer@example.com')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.customer)}')
+
+    def test_steady_state_adds_no_queries(self):
+        self.assertEqual(self.client.get('/api/me/').status_code, 200)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/me/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+    def test_blocking_user_invalidates_cache(self):
+        self.assertEqual(self.client.get('/api/me/').status_code, 200)
+        admin = APIClient()
+        admin.force_authenticate(self.staff)
+        response = admin.patch(f'/api/users/{self.customer.id}/', {'is_active': False}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get('/api/me/').status_code, 401)
+
+    def test_group_and_permission_changes_invalidate_cache(self):
+        group = Group.objects.create(name='editors')
+        permission = Permission.objects.get(codename='change_product')
+        changes = [
+            lambda: self.customer.groups.add(group),
+            lambda: group.user_set.remove(self.customer),
+            lambda: group.user_set.add(self.customer),
+            lambda: group.user_set.clear(),
+            lambda: permission.user_set.add(self.customer),
+            lambda: permission.user_set.clear(),
+            lambda: self.customer.user_permissions.clear(),
+        ]
+        for change in changes:
+            version = get_user_version(self.customer.id)
+            change()
+            self.assertNotEqual(get_user_version(self.customer.id), version)
+
+
+class RatingAggregateTests(TestCase):
+    def test_aggregates_follow_review_changes(self):
+        user = make_user('customer@example.com')
+        product = make_product()
+        reviews = [Review.objects.create(product=product, user=user, rating=r, comment='ok') for r in (5, 4, 3)]
+        reviews[2].rating = 1
+        reviews[2].save()
+        reviews[0].delete()
+
+        product.refresh_from_db()
+        self.assertEqual(product.rating_count, 2)
+        self.assertAlmostEqual(product.rating_avg, 2.5)
+        self.assertEqual(product.rating_histogram(), {1: 1, 2: 0, 3: 0, 4: 1, 5: 0})
+
+
+class CatalogCacheTests(TestCase):
+    def test_product_writes_invalidate_cached_reads(self):
+        product = make_product(name='Galaxy S8')
+        client = APIClient()
+        first = client.get(f'/api/products/{product.id}/')
+        with CaptureQueriesContext(connection) as ctx:
+            cached = client.get(f'/api/products/{product.id}/')
+            not_modified = client.get(f'/api/products/{product.id}/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertEqual((cached['ETag'], cached.json()), (first['ETag'], first.json()))
+        self.assertEqual(not_modified.status_code, 304)
+
+        client.force_authenticate(make_user('staff@example.com', is_staff=True))
+        self.assertEqual(client.patch(f'/api/products/{product.id}/', {'name': 'Galaxy S9'}).status_code, 200)
+        response = client.get(f'/api/products/{product.id}/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['name'], 'Galaxy S9')
+        self.assertNotEqual(response['ETag'], first['ETag'])
+
+        product.delete()
+        self.assertEqual(client.get(f'/api/products/{product.id}/').status_code, 404)
+
+
+class CatalogFacetTests(TestCase):
+    def setUp(self):
+        make_product(brand='Samsung', category='phone', price=Decimal('20000.00'))
+        make_product(brand='Samsung', category='audio', price=Decimal('5000.00'))
+        make_product(brand='Apple', category='phone', price=Decimal('120000.00'))
+        self.client = APIClient()
+
+    def test_filters(self):
+        response = self.client.get('/api/products/', {'category': 'phone', 'max_price': '50000'})
+        self.assertEqual([p['brand'] for p in response.data], ['Samsung'])
+
+    def test_non_finite_numbers_are_rejected(self):
+        for url in ('/api/products/', '/api/products/search/', '/api/products/facets/'):
+            for params in ({'min_price': 'nan'}, {'max_price': 'inf'}, {'min_price': '-Infinity'},
+                           {'min_price': 'sNaN'}, {'min_rating': 'nan'}):
+                self.assertEqual(self.client.get(url, params).status_code, 400, (url, params))
+
+    def test_facets_ignore_their_own_filter(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/products/facets/', {'brand': 'Samsung'})
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(response.data['total'], 2)
+        self.assertEqual(response.data['brands'], [{'value': 'Samsung', 'count': 2}, {'value': 'Apple', 'count': 1}])
+        self.assertEqual(response.data['categories'], [{'value': 'audio', 'count': 1}, {'value': 'phone', 'count': 1}])
+
+
+class EffectivePriceTests(TestCase):
+    def test_catalog_and_checkout_use_the_same_price(self):
+        cheap = make_product(price=Decimal('999.00'), discount=15)
+        make_product(price=Decimal('900.00'))
+        client = APIClient()
+
+        response = client.get('/api/products/', {'ordering': 'effective_price'})
+        self.assertEqual([p['effective_price'] for p in response.data], ['849.15', '900.00'])
+
+        client.force_authenticate(make_user('customer@example.com'))
+        response = client.post(
+            '/api/orders/create/', {'items': [{'product': cheap.id, 'quantity': 2}]}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Decimal(response.data['total_price']), Decimal('1698.30'))
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        self.customer = make_user('customer@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def checkout(self, items):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/orders/create/', {'items': items}, format='json')
+
+    def test_prices_come_from_the_catalog(self):
+        product = make_product(price=Decimal('1000.00'), discount=10)
+        response = self.checkout([{'product': product.id, 'quantity': 2, 'price': '1.00'}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Decimal(response.data['total_price']), Decimal('1800.00'))
+        self.assertEqual(OrderItem.objects.get().price, Decimal('900.00'))
+
+    def test_short_stock_rolls_everything_back(self):
+        plenty, scarce = make_product(quantity=10), make_product(quantity=1)
+        CartItem.objects.create(user=self.customer, product=plenty, quantity=1)
+        response = self.checkout([{'product': plenty.id, 'quantity': 2}, {'product': scarce.id, 'quantity': 2}])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Product.objects.get(pk=plenty.pk).quantity, 10)
+        self.assertTrue(CartItem.objects.filter(user=self.customer).exists())
+
+    def test_malformed_items_are_rejected(self):
+        for items in (5, None, [5], [{'product': 10 ** 20, 'quantity': 1}], [{'product': 1, 'quantity': 10 ** 20}]):
+            response = self.client.post('/api/orders/create/', {'items': items}, format='json')
+            self.assertEqual(response.status_code, 400, items)
+            self.assertIn('error', response.data)
+
+    def test_checkout_only_invalidates_the_ordered_products(self):
+        ordered, other = make_product(quantity=5), make_product(quantity=5)
+        reader = APIClient()
+        listing = reader.get('/api/products/')
+        detail = reader.get(f'/api/products/{ordered.id}/')
+        other_detail = reader.get(f'/api/products/{other.id}/')
+        self.assertEqual(self.checkout([{'product': ordered.id, 'quantity': 2}]).status_code, 200)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(reader.get('/api/products/', HTTP_IF_NONE_MATCH=listing['ETag']).status_code, 304)
+            self.assertEqual(reader.get(f'/api/products/{other.id}/', HTTP_IF_NONE_MATCH=other_detail['ETag']).status_code, 304)
+        self.assertEqual(len(ctx.captured_queries), 0)
+        response = reader.get(f'/api/products/{ordered.id}/', HTTP_IF_NONE_MATCH=detail['ETag'])
+        self.assertEqual((response.status_code, response.data['quantity']), (200, 3))
+
+        # Selling out changes what the catalog offers: lists refresh too.
+        self.assertEqual(self.checkout([{'product': ordered.id, 'quantity': 3}]).status_code, 200)
+        self.assertEqual(reader.get('/api/products/', HTTP_IF_NONE_MATCH=listing['ETag']).status_code, 200)
+
+
+class ChatDeliveryTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice@example.com')
+        self.bob = make_user('bob@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def test_long_poll_answers_at_once_when_messages_exist(self):
+        sent = ChatMessage.objects.create(sender=self.bob, recipient=self.alice, message='hi')
+        response = self.client.get('/api/chat/poll/', {'since_id': 0, 'with': self.bob.id})
+        self.assertEqual([m['id'] for m in response.data], [sent.id])
+
+        start = time.monotonic()
+        response = self.client.get('/api/chat/poll/', {'since_id': sent.id, 'timeout': '-5'})
+        self.assertEqual((response.status_code, response.data), (200, []))
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_bad_cursors_and_timeouts_are_rejected(self):
+        for params in ({'timeout': 'nan'}, {'timeout': 'inf'}, {'timeout': 'abc'},
+                       {'since_id': 10 ** 20}, {'since_id': -1}, {'with': 'bob'}):
+            self.assertEqual(self.client.get('/api/chat/poll/', params).status_code, 400, params)
+
+    def test_waiting_poll_wakes_on_publish(self):
+        sent = ChatMessage.objects.create(sender=self.bob, recipient=self.alice, message='hi')
+        channel = chat.user_channel(self.alice.id)
+        wake = threading.Timer(0.2, lambda: chat.get_broker().publish(channel))
+        results = iter([[], [{'id': sent.id}]])
+        with mock.patch('shop.chat.messages_since', lambda *args: next(results)):
+            start = time.monotonic()
+            wake.start()
+            messages = chat.wait_for_messages(self.alice, sent.id - 1, timeout=10)
+        self.assertEqual(messages, [{'id': sent.id}])
+        self.assertLess(time.monotonic() - start, 5)
+
+    def test_event_stream_resumes_from_last_event_id(self):
+        first = ChatMessage.objects.create(sender=self.bob, recipient=self.alice, message='one')
+        second = ChatMessage.objects.create(sender=self.alice, recipient=self.bob, message='two')
+        token = AccessToken.for_user(self.alice)
+        response = self.client.get('/api/chat/stream/', {'token': str(token)}, HTTP_LAST_EVENT_ID=str(first.id))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b''.join(response.streaming_content).decode()
+        self.assertIn(f'id: {second.id}\nevent: message\n', body)
+        self.assertNotIn(f'id: {first.id}\n', body)
+
+        with mock.patch('shop.chat.MAX_WAIT', 0.1):
+            response = APIClient().get('/api/chat/stream/', {'token': str(token), 'since_id': second.id})
+            self.assertEqual(b''.join(response.streaming_content).decode(), 'retry: 1000\n\n')
+        self.assertEqual(APIClient().get('/api/chat/stream/', {'token': 'nope'}).status_code, 401)
+
+
+class NotificationFeedTests(TestCase):
+    def setUp(self):
+        self.user = make_user('reader@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.notes = [Notification.objects.create(user=self.user, message=f'n{i}') for i in range(4)]
+
+    def counter(self):
+        return NotificationCounter.objects.get(user=self.user).unread
+
+    def test_counter_follows_create_delete_and_mark_read(self):
+        self.assertEqual(self.counter(), 4)
+        self.notes[0].delete()
+        self.assertEqual(self.counter(), 3)
+
+        response = self.client.post('/api/notifications/mark-read/', {'ids': [self.notes[1].id]}, format='json')
+        self.assertEqual(response.data, {'updated': 1, 'unread': 2})
+        response = self.client.post('/api/notifications/mark-read/', {'up_to': self.notes[2].id}, format='json')
+        self.assertEqual(response.data, {'updated': 1, 'unread': 1})
+        # Deleting a read notification leaves the count alone.
+        Notification.objects.filter(id=self.notes[1].id).delete()
+        self.assertEqual(self.client.get('/api/notifications/unread-count/').data, {'unread': 1})
+
+        response = self.client.post('/api/notifications/mark-read/', {}, format='json')
+        self.assertEqual(response.data, {'updated': 1, 'unread': 0})
+        self.assertEqual(Notification.objects.filter(user=self.user, is_read=False).count(), 0)
+        self.assertEqual(self.client.post('/api/notifications/mark-read/', {'ids': 'x'}, format='json').status_code, 400)
+
+    def test_limit_is_clamped(self):
+        ids = lambda params: [n['id'] for n in self.client.get('/api/notifications/', params).data]
+        self.assertEqual(ids({'limit': 2}), [self.notes[3].id, self.notes[2].id])
+        self.assertEqual(ids({'limit': -1}), [self.notes[3].id])
+        self.assertEqual(ids({'limit': 0, 'after': self.notes[1].id}), [self.notes[2].id])
+        self.assertEqual(len(ids({'limit': 10 ** 6})), 4)
+        self.assertEqual(self.client.get('/api/notifications/', {'limit': 'all'}).status_code, 400)
+
+
+@mock.patch.dict(settings.DATABASES, {'replica': {}})
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        token = db_router._pinned.set(False)
+        self.addCleanup(db_router._pinned.reset, token)
+
+    def test_catalog_reads_go_to_the_replica_until_a_write(self):
+        self.assertEqual(self.router.db_for_read(Product), 'replica')
+        self.assertEqual(self.router.db_for_read(Order), 'default')
+        with mock.patch.object(connections['default'], 'in_atomic_block', True):
+            self.assertEqual(self.router.db_for_read(Product), 'default')
+
+        self.assertEqual(self.router.db_for_write(Product), 'default')
+        self.assertEqual(self.router.db_for_read(Product), 'default')
+
+    def test_catalog_cache_misses_read_from_the_primary(self):
+        cache.clear()
+        request = RequestFactory().get('/api/products/')
+        seen = []
+
+        def build_response():
+            seen.append(self.router.db_for_read(Product))
+            return Response({})
+
+        self.assertEqual(self.router.db_for_read(Product), 'replica')
+        cached_catalog_response(request, build_response)
+        self.assertEqual(seen, ['default'])
+
+    def test_without_a_replica_the_router_stays_out(self):
+        with mock.patch.dict(settings.DATABASES):
+            del settings.DATABASES['replica']
+            self.assertIsNone(self.router.db_for_read(Product))
+
+    def test_middleware_pins_per_request(self):
+        seen = []
+
+        def view(request):
+            seen.append(self.router.db_for_read(Product))
+            if request.GET.get('write'):
+                self.router.db_for_write(Order)
+                seen.append(self.router.db_for_read(Product))
+            return HttpResponse()
+
+        middleware = ReplicaPinningMiddleware(view)
+        factory = RequestFactory()
+        middleware(factory.post('/'))
+        middleware(factory.get('/', {'write': 1}))
+        middleware(factory.get('/'))
+        self.assertEqual(seen, ['default', 'replica', 'default', 'replica'])
+        self.assertEqual(self.router.db_for_read(Product), 'replica')
+
+
+class SQLitePragmaTests(SimpleTestCase):
+    @override_settings(SQLITE_HIGH_CONCURRENCY=True)
+    def test_busy_timeout_follows_the_timeout_option(self):
+        for options, expected in (({'timeout': 20}, 20000), ({}, 5000)):
+            default = connections['default']
+            wrapper = type(default)({**default.settings_dict, 'NAME': ':memory:', 'OPTIONS': options}, 'pragma_test')
+            try:
+                with wrapper.cursor() as cursor:
+                    cursor.execute('PRAGMA busy_timeout')
+                    self.assertEqual(cursor.fetchone()[0], expected)
+            finally:
+                wrapper.close()
+
+
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        self.staff = make_user('staff@example.com', is_staff=True, is_superuser=True)
+        self.customer = make_user('customer@example.com')
+        self.phone = make_product(price=Decimal('100.00'))
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def order(self, quantity):
+        response = self.client.post(
+            '/api/orders/create/', {'items': [{'product': self.phone.id, 'quantity': quantity}]}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.data['id']
+
+    def rollups(self):
+        day = DailySales.objects.get()
+        return ProductSales.objects.get(product=self.phone).quantity_sold, day.order_count, day.revenue
+
+    def assert_in_sync(self):
+        out = io.StringIO()
+        call_command('rebuild_sales_rollups', '--check', stdout=out)
+        self.assertIn('Found 0 product rows and 0 daily rows', out.getvalue())
+
+    def test_cancelled_orders_leave_the_rollups_whatever_the_path(self):
+        first, second = self.order(2), self.order(1)
+        self.assertEqual(self.rollups(), (3, 2, Decimal('300.00')))
+
+        self.client.force_authenticate(self.staff)
+        self.client.patch(f'/api/orders/{first}/', {'order_status': 'cancelled'}, format='json')
+        self.assertEqual(self.rollups(), (1, 1, Decimal('100.00')))
+        self.assert_in_sync()
+
+        self.client.patch(f'/api/orders/{first}/status/', {'order_status': 'processing'}, format='json')
+        self.client.patch(f'/api/orders/{second}/', {'total_price': '90.00'}, format='json')
+        self.assertEqual(self.rollups(), (3, 2, Decimal('290.00')))
+        self.assert_in_sync()
+
+        self.assertEqual(self.client.delete(f'/api/orders/{first}/').status_code, 204)
+        self.assertEqual(self.rollups(), (1, 1, Decimal('90.00')))
+        self.client.force_login(self.staff)
+        self.client.post('/admin/shop/order/', {'action': 'delete_selected', '_selected_action': [second], 'post': 'yes'})
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.rollups(), (0, 0, Decimal('0.00')))
+        self.assert_in_sync()
+
+    def test_orders_created_outside_checkout_are_counted(self):
+        self.client.force_login(self.staff)
+        response = self.client.post('/admin/shop/order/add/', {
+            'user': self.customer.id, 'total_price': '50.00', 'payment_method': 'COD',
+            'payment_status': 'pending', 'order_status': 'pending',
+        })
+        self.assertEqual(response.status_code, 302)
+        order = Order.objects.get()
+        self.assertEqual(DailySales.objects.get().order_count, 1)
+        self.assert_in_sync()
+
+        line = OrderItem.objects.create(order=order, product=self.phone, quantity=2, price=Decimal('25.00'))
+        self.assertEqual(self.rollups(), (2, 1, Decimal('50.00')))
+        line.quantity = 3
+        line.save()
+        self.assert_in_sync()
+        OrderItem.objects.create(order=order, product=self.phone, quantity=1, price=Decimal('25.00')).delete()
+        self.assertEqual(self.rollups(), (3, 1, Decimal('50.00')))
+
+        order.order_status = 'cancelled'
+        order.save()
+        self.assertEqual(self.rollups(), (0, 0, Decimal('0.00')))
+        self.assert_in_sync()
+        line.delete()
+        order.delete()
+        self.assertEqual(self.rollups(), (0, 0, Decimal('0.00')))
+        self.assert_in_sync()
+
+    def test_dashboard_limit_is_validated(self):
+        self.order(1)
+        self.client.force_authenticate(self.staff)
+        for url in ('/api/dashboard/stats/', '/api/dashboard/most-selling/'):
+            self.assertEqual(self.client.get(url, {'limit': 'abc'}).status_code, 400)
+            self.assertEqual(self.client.get(url, {'limit': '-1'}).status_code, 200)
+        self.assertEqual(len(self.client.get('/api/dashboard/stats/', {'limit': 0}).data['most_selling_products']), 1)
+
+
+class SeedDataTests(TestCase):
+    def seed(self, **options):
+        call_command('seed_data', users=3, products=4, reviews=5, carts=2, orders=6, messages=4,
+                     stdout=io.StringIO(), **options)
+        return list(Product.objects.order_by('sku').values_list('sku', 'name', 'price'))
+
+    def test_rerun_needs_flush_and_reproduces_the_rows(self):
+        customer = make_user('real@example.com')
+        first = self.seed()
+        with self.assertRaises(CommandError):
+            self.seed()
+        self.assertEqual(self.seed(flush=True), first)
+        self.assertEqual(Order.objects.count(), 6)
+        self.assertEqual(User.objects.filter(email__startswith='bench-').count(), 4)
+        self.assertTrue(User.objects.filter(pk=customer.pk).exists())
+
+
+class CartSummaryTests(TestCase):
+    def test_summary_is_one_query(self):
+        user = make_user('customer@example.com')
+        CartItem.objects.create(user=user, product=make_product(price=Decimal('999.00'), discount=15, quantity=2), quantity=3)
+        CartItem.objects.create(user=user, product=make_product(price=Decimal('100.00')), quantity=1)
+        client = APIClient()
+        client.force_authenticate(user)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get('/api/cart/summary/')
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual([line['line_total'] for line in response.data['items']], ['2547.45', '100.00'])
+        self.assertEqual(response.data['total'], '2647.45')
+        self.assertEqual(response.data['item_count'], 4)
+        self.assertFalse(response.data['all_in_stock'])
+
+    def test_batch_operations_apply_in_order(self):
+        user = make_user('customer@example.com')
+        kept, added, removed = make_product(), make_product(), make_product()
+        CartItem.objects.create(user=user, product=kept, quantity=5)
+        CartItem.objects.create(user=user, product=removed, quantity=1)
+        client = APIClient()
+        client.force_authenticate(user)
+
+        response = client.post('/api/cart/batch/', {'operations': [
+            {'op': 'set', 'product': kept.id, 'quantity': 1},
+            {'op': 'add', 'product': kept.id, 'quantity': 2},
+            {'op': 'add', 'product': added.id},
+            {'op': 'add', 'product': added.id},
+            {'op': 'remove', 'product': removed.id},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            dict(CartItem.objects.filter(user=user).values_list('product_id', 'quantity')),
+            {kept.id: 3, added.id: 2},
+        )
+
+    def test_oversized_ids_and_quantities_are_rejected(self):
+        user = make_user('customer@example.com')
+        phone = make_product()
+        CartItem.objects.create(user=user, product=phone, quantity=5)
+        client = APIClient()
+        client.force_authenticate(user)
+        huge = 10 ** 20
+
+        for operations in ([{'op': 'add', 'product': huge}], [{'op': 'set', 'product': phone.id, 'quantity': huge}],
+                           [{'op': 'add', 'product': phone.id, 'quantity': 2 ** 30}] * 2):
+            response = client.post('/api/cart/batch/', {'operations': operations}, format='json')
+            self.assertEqual(response.status_code, 400, operations)
+        self.assertEqual(client.post('/api/cart/', {'product_id': huge}, format='json').status_code, 404)
+        self.assertEqual(client.post('/api/cart/', {'product_id': phone.id, 'quantity': huge}).status_code, 400)
+        self.assertEqual(client.post('/api/cart-items/', {'product': phone.id, 'quantity': huge}).status_code, 400)
+
+        # Each increment fits on its own, but not on top of what is in the cart.
+        for response in (
+            client.post('/api/cart/batch/', {'operations': [
+                {'op': 'add', 'product': phone.id, 'quantity': checkout.MAX_QUANTITY},
+            ]}, format='json'),
+            client.post('/api/cart/', {'product_id': phone.id, 'quantity': checkout.MAX_QUANTITY}),
+            client.post('/api/cart-items/', {'product': phone.id, 'quantity': checkout.MAX_QUANTITY}),
+        ):
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(CartItem.objects.get(user=user).quantity, 5)
+
+    def test_update_onto_a_product_already_in_the_cart_is_rejected(self):
+        user = make_user('customer@example.com')
+        first, second = make_product(), make_product()
+        line = CartItem.objects.create(user=user, product=first, quantity=1)
+        CartItem.objects.create(user=user, product=second, quantity=2)
+        serializer = CartItemSerializer(line, data={'product': second.id}, partial=True)
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('product', serializer.errors)
+
+        serializer = CartItemSerializer(line, data={'product': first.id, 'quantity': 4}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+        self.assertEqual(CartItem.objects.get(pk=line.pk).quantity, 4)
+
+class OrderExportTests(TestCase):
+    def test_streams_filtered_orders(self):
+        staff = make_user('staff@example.com', is_staff=True)
+        customer = make_user('customer@example.com')
+        order = Order.objects.create(user=customer, total_price=Decimal('1000.00'))
+        OrderItem.objects.create(order=order, product=make_product(), quantity=2, price=Decimal('500.00'))
+        Order.objects.create(user=customer, total_price=Decimal('1.00'), order_status='cancelled')
+        client = APIClient()
+        client.force_authenticate(staff)
+
+        response = client.get('/api/orders/export/', {'output': 'ndjson', 'status': 'pending'})
+        self.assertEqual(response.status_code, 200)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertIn('"quantity": 2', lines[0])
+
+        response = client.get('/api/orders/export/')
+        self.assertEqual(len(b''.join(response.streaming_content).decode().splitlines()), 3)
+
+    def test_csv_neutralises_formulas(self):
+        staff = make_user('staff@example.com', is_staff=True)
+        customer = make_user('customer@example.com')
+        User.objects.filter(pk=customer.pk).update(full_name='=HYPERLINK("http://evil.example")')
+        order = Order.objects.create(user=customer, total_price=Decimal('5.00'), payment_method='@SUM(A1)')
+        OrderItem.objects.create(order=order, product=make_product(name='-2+3'), quantity=1, price=Decimal('5.00'))
+        client = APIClient()
+        client.force_authenticate(staff)
+
+        response = client.get('/api/orders/export/')
+        [row] = csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode()))
+        self.assertEqual(row['customer_name'], '\'=HYPERLINK("http://evil.example")')
+        self.assertEqual(row['payment_method'], "'@SUM(A1)")
+        self.assertEqual(row['product_name'], "'-2+3")
+        self.assertEqual((row['customer_email'], row['total_price']), ('customer@example.com', '5.00'))
+
+
+class ProductImportTests(TestCase):
+    def test_upserts_on_sku_and_reports_bad_rows(self):
+        make_product(sku='SKU-1', name='Old name')
+        rows = io.StringIO(
+            'sku,name,brand,price,quantity,description,category\n'
+            'SKU-1,,,750.00,,,\n'
+            'SKU-2,Galaxy,Samsung,500.00,4,Phone,phone\n'
+            'SKU-3,Broken,Samsung,abc,4,Phone,phone\n'
+        )
+        report = ProductImporter(batch_size=2).run(read_rows(rows, 'csv'))
+
+        self.assertEqual((report['created'], report['updated'], report['failed']), (1, 1, 1))
+        self.assertEqual(report['errors'][0]['line'], 4)
+        updated = Product.objects.get(sku='SKU-1')
+        self.assertEqual((updated.name, updated.price), ('Old name', Decimal('750.00')))
+        self.assertEqual(Product.objects.get(sku='SKU-2').effective_price, Decimal('500.00'))
+
+
+class AdminChangelistTests(TestCase):
+    def test_large_table_changelist_uses_row_estimate(self):
+        staff = make_user('staff@example.com', is_staff=True, is_superuser=True)
+        customer = make_user('buyer@example.com')
+        for _ in range(3):
+            Order.objects.create(user=customer, total_price=Decimal('1.00'))
+        self.client.force_login(staff)
+
+        with mock.patch.object(EstimatedCountPaginator, 'estimate_above', 1):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get('/admin/shop/order/')
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse([q for q in ctx.captured_queries if 'COUNT(' in q['sql'] and 'shop_order' in q['sql']])
+
+            # Filtered changelists count exactly.
+            response = self.client.get('/admin/shop/order/', {'order_status__exact': 'pending'})
+            self.assertEqual(response.context['cl'].result_count, 3)
+
+
+class LeanSerializerTests(TestCase):
+    def test_matches_model_serializers(self):
+        customer = make_user('buyer@example.com')
+        with_image = make_product(sku='SKU-1', image='product_images/phone.jpg', discount=15)
+        plain = make_product()
+        order = Order.objects.create(user=customer, total_price=Decimal('10.00'))
+        OrderItem.objects.create(order=order, product=with_image, quantity=1, price=Decimal('8.50'))
+        OrderItem.objects.create(order=order, product=plain, quantity=2, price=Decimal('1.00'))
+        request = RequestFactory().get('/api/products/')
+        renderer = JSONRenderer()
+
+        cases = [
+            (ProductSerializer, ProductLeanSerializer, Product.objects.order_by('id')),
+            (OrderItemSerializer, OrderItemLeanSerializer, OrderItem.objects.order_by('id')),
+            (UserSerializer, UserLeanSerializer, User.objects.order_by('id')),
+        ]
+        for serializer_class, lean_class, queryset in cases:
+            for context in ({}, {'request': request}):
+                expected = serializer_class(queryset, many=True, context=context).data
+                lean = lean_class(context=context).serialize(queryset)
+                self.assertEqual(renderer.render(lean), renderer.render(expected))
+                self.assertEqual(FastJSONRenderer().render(lean), renderer.render(expected))
+
+    def test_list_endpoint_uses_one_query(self):
+        make_product()
+        make_product()
+        with CaptureQueriesContext(connection) as ctx:
+            response = APIClient().get('/api/products/search/', {'ordering': 'effective_price'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 2)
+        self.assertEqual(len(ctx.captured_queries), 2)  # page count + rows
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        self.customer = make_user('buyer@example.com')
+        self.product = make_product(image='product_images/phone.jpg')
+        order = Order.objects.create(user=self.customer, total_price=Decimal('10.00'))
+        OrderItem.objects.create(order=order, product=self.product, quantity=2, price=Decimal('5.00'))
+        CartItem.objects.create(user=self.customer, product=self.product, quantity=1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def test_product_list_reads_only_selected_columns(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/products/', {'fields': 'id,name,effective_price,thumbnail'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()[0]), {'id', 'name', 'effective_price', 'thumbnail'})
+        self.assertNotIn('description', ctx.captured_queries[-1]['sql'])
+
+        response = self.client.get('/api/products/', {'fields': 'id,nope'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_orders_collapse_relations_unless_expanded(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/orders/', {'fields': 'id,user,total_price'})
+        order = response.json()['results'][0]
+        self.assertEqual(order, {'id': order['id'], 'user': self.customer.id, 'total_price': '10.00'})
+        self.assertEqual(len(ctx.captured_queries), 2)  # ETag marker + orders, no items or users
+
+        response = self.client.get('/api/orders/', {'fields': 'id,items', 'expand': 'items'})
+        self.assertEqual(response.json()['results'][0]['items'][0]['quantity'], 2)
+
+    def test_cart_can_expand_product(self):
+        response = self.client.get('/api/cart/', {'fields': 'id,quantity,product', 'expand': 'product'})
+        self.assertEqual(response.json()[0]['product']['id'], self.product.id)
+        self.assertEqual(self.client.get('/api/cart/').json()[0]['product'], self.product.id)
+
+
+class CompressionTests(TestCase):
+    def test_large_api_responses_are_gzipped(self):
+        for _ in range(10):
+            make_product()
+        response = self.client.get('/api/products/', HTTP_ACCEPT_ENCODING='gzip;q=1, br;q=0')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertTrue(response['ETag'].startswith('W/'))
+        self.assertEqual(len(json.loads(gzip.decompress(response.content))), 10)
+
+        # Still a 304 when the client sends back the weak ETag.
+        response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_small_responses_are_left_alone(self):
+        user = make_user('buyer@example.com')
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get('/api/notifications/unread-count/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+
+class ConditionalGetTests(TestCase):
+    def test_catalog_honours_if_modified_since(self):
+        make_product()
+        now = time.time()
+        # Last-Modified is only sent once the second of the change is over.
+        with mock.patch('shop.caching.time.time', return_value=now + 5):
+            last_modified = self.client.get('/api/products/')['Last-Modified']
+            self.assertEqual(self.client.get('/api/products/', HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        with mock.patch('shop.caching.time.time', return_value=now + 8):
+            make_product()
+        with mock.patch('shop.caching.time.time', return_value=now + 10):
+            self.assertEqual(self.client.get('/api/products/', HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 200)
+
+    def test_order_list_etag_tracks_status_changes(self):
+        staff = make_user('staff@example.com', is_staff=True)
+        customer = make_user('buyer@example.com')
+        order = Order.objects.create(user=customer, total_price=Decimal('5.00'))
+        client = APIClient()
+        client.force_authenticate(customer)
+
+        etag = client.get('/api/orders/')['ETag']
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get('/api/orders/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+        client.force_authenticate(staff)
+        client.patch(f'/api/orders/{order.id}/status/', {'order_status': 'shipped'}, format='json')
+        client.force_authenticate(customer)
+        self.assertEqual(client.get('/api/orders/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_order_list_etags_track_deletes_and_embedded_rows(self):
+        staff = make_user('staff@example.com', is_staff=True)
+        customer = make_user('buyer@example.com')
+        product = make_product(name='Phone')
+        older, newer = (Order.objects.create(user=customer, total_price=Decimal('5.00')) for _ in range(2))
+        OrderItem.objects.create(order=newer, product=product, quantity=1, price=Decimal('5.00'))
+        staff_client, customer_client = APIClient(), APIClient()
+        staff_client.force_authenticate(staff)
+        customer_client.force_authenticate(customer)
+
+        changes = [
+            lambda: older.delete(),
+            lambda: User.objects.get(pk=customer.pk).save(),
+            lambda: Product.objects.get(pk=product.pk).save(),
+        ]
+        for client, change in zip([staff_client, staff_client, customer_client], changes):
+            etag = client.get('/api/orders/')['ETag']
+            change()
+            self.assertEqual(client.get('/api/orders/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        # Logging in only updates last_login, which no order list shows.
+        etag = staff_client.get('/api/orders/')['ETag']
+        update_last_login(None, customer)
+        self.assertEqual(staff_client.get('/api/orders/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_notification_feed_revalidates_without_queries(self):
+        user = make_user('reader@example.com')
+        read, unread = (Notification.objects.create(user=user, message='hi') for _ in range(2))
+        Notification.objects.filter(pk=read.pk).update(is_read=True)
+        client = APIClient()
+        client.force_authenticate(user)
+
+        etag = client.get('/api/notifications/')['ETag']
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(client.get('/api/notifications/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+        for change in (lambda: Notification.objects.filter(pk=read.pk).delete(),
+                       lambda: client.post('/api/notifications/mark-read/', {}, format='json')):
+            change()
+            self.assertEqual(client.get('/api/notifications/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+            etag = client.get('/api/notifications/')['ETag']
+
+
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        use_temporary_media(self)
+
+    def test_derivatives_are_advertised_once_written(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (800, 600), 'red').save(buffer, 'PNG')
+        name = default_storage.save('product_images/phone.png', ContentFile(buffer.getvalue()))
+        product = make_product(image=name)
+        client = APIClient()
+
+        data = client.get(f'/api/products/{product.id}/').json()
+        self.assertEqual(data['thumbnail'], data['image'])
+        self.assertEqual(data['image_variants']['card']['jpg'], data['image'])
+        self.assertEqual(data['image_srcset'], data['image'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(generate_derivatives(name), 6)
+        data = client.get(f'/api/products/{product.id}/').json()
+        self.assertTrue(data['thumbnail'].endswith('_thumbnail.webp'))
+        self.assertIn(' 400w', data['image_srcset'])
+        response = client.get(urlsplit(data['thumbnail']).path)
+        self.assertEqual(response.status_code, 200)
+        response.close()
+
+        # A new image goes back to the original until its own derivatives exist.
+        product.image = default_storage.save('product_images/other.png', ContentFile(buffer.getvalue()))
+        product.save()
+        data = client.get(f'/api/products/{product.id}/').json()
+        self.assertEqual(data['thumbnail'], data['image'])
+
+    def test_worker_closes_its_connections(self):
+        # The in-memory test database ignores close(), so watch the call.
+        for outcome in (None, OSError('corrupt image')):
+            with mock.patch('shop.images.generate_derivatives', side_effect=outcome), \
+                    mock.patch('shop.images.connections') as worker_connections, \
+                    self.assertLogs('shop.images', 'ERROR') if outcome else contextlib.nullcontext():
+                schedule_derivatives('product_images/phone.png').result()
+            worker_connections.close_all.assert_called_once_with()
+
+
+class MediaServingTests(TestCase):
+    def setUp(self):
+        use_temporary_media(self)
+
+    def fetch(self, url, **extra):
+        response = self.client.generic(extra.pop('method', 'GET'), url, **extra)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        response.close()
+        return response, body
+
+    def test_uploads_are_content_hashed_and_cached_for_good(self):
+        name = default_storage.save('product_images/phone.webp', ContentFile(b'0123456789' * 10))
+        self.assertRegex(name, r'^product_images/phone\.[0-9a-f]{12}\.webp$')
+        # Same bytes, same file.
+        self.assertEqual(default_storage.save('product_images/phone.webp', ContentFile(b'0123456789' * 10)), name)
+
+        response, body = self.fetch(f'/media/{name}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(body), 100)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['Content-Type'], 'image/webp')
+
+        response, body = self.fetch(f'/media/{name}', HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/100')
+        self.assertEqual(body, b'0123456789')
+
+        response, body = self.fetch(f'/media/{name}', method='HEAD')
+        self.assertEqual((response.status_code, response['Content-Length'], body), (200, '100', b''))
+
+    def test_unhashed_and_missing_media(self):
+        with open(f'{default_storage.location}/legacy.webp', 'wb') as f:
+            f.write(b'x')
+        response, _ = self.fetch('/media/legacy.webp')
+        self.assertEqual(response['Cache-Control'], 'max-age=86400, public')
+        self.assertEqual(self.fetch('/media/missing.webp')[0].status_code, 404)
+        self.assertEqual(self.fetch('/media/../manage.py')[0].status_code, 404)
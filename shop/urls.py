@@ -36,6 +36,8 @@ urlpatterns = [
     # Order
     path('orders/', views.get_all_orders),
     path('orders/create/', views.create_order),
+    path('orders/export/', views.export_orders_view, name='orders-export'),
+    path('products/import/', views.import_products_view, name='products-import'),
 
     # User
     path('me/', views.get_user_profile),
@@ -46,8 +48,13 @@ urlpatterns = [
     path('reviews/', ReviewListCreateView.as_view(), name='review-list-create'),
     path('products/<int:pk>/reviews/', ProductReviewListCreateView.as_view(), name='product-reviews'),
 
+    # Catalog search
+    path('products/search/', ProductListView.as_view(), name='product-search'),
+
     # Chat
     path('chat/', views.ChatMessageListCreateView.as_view()),
+    path('chat/poll/', views.chat_poll, name='chat-poll'),
+    path('chat/stream/', views.chat_stream, name='chat-stream'),
 
     # Token
     path('token/', CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
@@ -66,6 +73,10 @@ urlpatterns = [
     # Additional URLs
     path('orders/<int:pk>/status/', views.update_order_status, name='update_order_status'),
     path('notifications/', views.user_notifications, name='user_notifications'),
+    path('notifications/unread-count/', views.unread_notification_count, name='notification-unread-count'),
+    path('notifications/mark-read/', views.mark_notifications_read, name='notification-mark-read'),
+    path('dashboard/stats/', views.dashboard_stats, name='dashboard-stats'),
+    path('dashboard/most-selling/', views.MostSellingProductsView.as_view(), name='most-selling-products'),
 ]
 
 
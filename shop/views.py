@@ -1,23 +1,50 @@
+import io
+import json
+import math
+
+from django.conf import settings
 from django.shortcuts import render
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.decorators import api_view, permission_classes, parser_classes
-from rest_framework.permissions import IsAuthenticated, AllowAny, IsAuthenticatedOrReadOnly
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAuthenticatedOrReadOnly, IsAdminUser
 from rest_framework.parsers import MultiPartParser, FormParser
-from .models import Product, Order, OrderItem, CartItem, ShippingAddress, Review, Notification
+from .models import Product, Order, OrderItem, CartItem, ShippingAddress, Review, Notification, ProductSales, DailySales
 from .serializers import ProductSerializer, OrderSerializer, UserSerializer, ChatMessageSerializer, OrderItemSerializer, CartItemSerializer, ShippingAddressSerializer, ReviewSerializer
 from rest_framework_simplejwt.views import TokenObtainPairView
 from .serializers import MyTokenObtainPairSerializer, RegisterSerializer
+from .serializers import OrderItemLeanSerializer, ProductLeanSerializer, UserLeanSerializer
 from rest_framework.permissions import AllowAny
 from rest_framework import generics
 from rest_framework import viewsets, permissions, status
 from rest_framework import generics
-from rest_framework.filters import SearchFilter
 from shop.models import ChatMessage
+from .authentication import CachedJWTAuthentication, get_user_version
+from .search import FullTextSearchFilter
+from .facets import facet_counts
+from .exports import ExportError, export_orders
+from .imports import ProductImporter, ProductImportError, format_for, read_rows
+from .filters import ProductFacetFilter, ProductRatingFilter, StableOrderingFilter, catalog_criteria, limit_param, list_param
+from .pagination import ProductSearchPagination, OrderCursorPagination, ReviewCursorPagination
+from .caching import (
+    cached_catalog_response, catalog_cached, conditional_response, get_catalog_version, get_orders_version,
+    get_product_version,
+)
+from . import chat, checkout, notifications
+from .cart import CartError, add_items, apply_operations, cart_summary
+from .lean import LeanListMixin
+from .fieldsets import Fieldset, SparseFieldsetViewMixin
 
 from django.db import models
 from django.contrib.auth import get_user_model
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed, ValidationError
+from rest_framework_simplejwt.exceptions import InvalidToken
 from django.db.models import Sum
 
 # Create your views here.
@@ -48,31 +75,92 @@ def add_product(request):
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@catalog_cached
 def get_all_products(request):
-    products = Product.objects.all()
-    serializer = ProductSerializer(products, many=True)
-    return Response(serializer.data)
+    fieldset = Fieldset.from_request(request, ProductSerializer)
+    return Response(ProductLeanSerializer(context={'fieldset': fieldset}).serialize(Product.objects.all()))
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def get_product_by_id(request, pk):
-    try:
-        product = Product.objects.get(id=pk)
-        serializer = ProductSerializer(product)
-        return Response(serializer.data)
-    except Product.DoesNotExist:
-        return Response({"detail": "Product not found"}, status=404)
+    def build_response():
+        try:
+            product = Product.objects.get(id=pk)
+            serializer = ProductSerializer(product)
+            return Response(serializer.data)
+        except Product.DoesNotExist:
+            return Response({"detail": "Product not found"}, status=404)
+    return cached_catalog_response(request, build_response, get_product_version(pk))
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_all_orders(request):
     user = request.user
-    if user.is_staff or user.is_superuser:
-        orders = Order.objects.all()
+    fieldset = Fieldset.from_request(request, OrderSerializer)
+    orders = fieldset.prune(Order.objects.with_details())
+    staff = user.is_staff or user.is_superuser
+    if not staff:
+        orders = orders.filter(user=user)
+
+    def build_response():
+        paginator = OrderCursorPagination()
+        page = paginator.paginate_queryset(orders, request)
+        serializer = OrderSerializer(page, many=True, context={'request': request, 'fieldset': fieldset})
+        return paginator.get_paginated_response(serializer.data)
+
+    if staff:
+        # Deleting an older order or renaming a user moves none of the
+        # aggregates over the whole table, so use the invalidation versions.
+        marker = {'orders': get_orders_version(), 'catalog': get_catalog_version()}
     else:
-        orders = Order.objects.filter(user=user)  # <-- FIXED HERE
-    serializer = OrderSerializer(orders, many=True)
-    return Response(serializer.data)
+        # The customer's own orders plus the user and products they embed.
+        marker = {**orders.change_marker(), 'user': get_user_version(user.pk), 'catalog': get_catalog_version()}
+    return conditional_response(request, build_response, sorted(marker.items()))
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+@parser_classes([MultiPartParser])
+def import_products_view(request):
+    """
+    Bulk upsert products from an uploaded CSV/NDJSON ``file``.
+
+    Streams one NDJSON progress line per batch; the last one has
+    ``"done": true`` and the rejected rows.
+    """
+    upload = request.FILES.get('file')
+    if upload is None:
+        return Response({'error': 'Upload the catalog as "file".'}, status=400)
+    try:
+        fmt = format_for(upload.name, request.data.get('input_format'))
+    except ProductImportError as e:
+        return Response({'error': str(e)}, status=400)
+
+    importer = ProductImporter(
+        image_root=settings.PRODUCT_IMPORT_IMAGE_ROOT,
+        dry_run=request.data.get('dry_run') in ('1', 'true', 'True'),
+    )
+    rows = read_rows(io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline=''), fmt)
+    lines = (json.dumps(report) + '\n' for report in importer.run_batches(rows))
+    return StreamingHttpResponse(lines, content_type='application/x-ndjson')
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def export_orders_view(request):
+    """Stream orders and their items as ?output=csv (default) or ndjson."""
+    fmt = request.query_params.get('output', 'csv')
+    try:
+        lines, content_type = export_orders(
+            fmt,
+            start=request.query_params.get('start'),
+            end=request.query_params.get('end'),
+            statuses=list_param(request, 'status'),
+            payment_statuses=list_param(request, 'payment_status'),
+        )
+    except ExportError as e:
+        return Response({'error': str(e)}, status=400)
+    response = StreamingHttpResponse(lines, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="orders-{timezone.now():%Y%m%d-%H%M%S}.{fmt}"'
+    return response
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     def validate(self, attrs):
@@ -92,20 +180,25 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
 class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
 
-    def post(self, request, *args, **kwargs):
-        print("LOGIN DATA RECEIVED:", request.data)
-        return super().post(request, *args, **kwargs)
-
-class OrderViewSet(viewsets.ModelViewSet):
-    queryset = Order.objects.all().order_by('-created_at')
+class OrderViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
+    queryset = Order.objects.all().order_by('-created_at', '-id')
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = OrderCursorPagination
+
+    def get_permissions(self):
+        # Customers only read their orders here: they place them through
+        # checkout, and status, payment and totals are staff business.
+        if self.action in ('list', 'retrieve'):
+            return [permissions.IsAuthenticated()]
+        return [permissions.IsAdminUser()]
 
     def get_queryset(self):
         user = self.request.user
+        orders = Order.objects.with_details()
         if user.is_staff or user.is_superuser:
-            return Order.objects.all()
-        return Order.objects.filter(customer=user)
+            return orders
+        return orders.filter(user=user)
 
 # Update Product
 @api_view(['PUT'])
@@ -136,11 +229,16 @@ def delete_product(request, pk):
 from .models import Product
 from .serializers import ProductSerializer
 
-class ProductListView(generics.ListAPIView):
+PRODUCT_ORDERING_FIELDS = ['effective_price', 'rating_avg', 'rating_count', 'price', 'discount', 'created_at', 'name']
+
+class ProductListView(SparseFieldsetViewMixin, LeanListMixin, generics.ListAPIView):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
-    filter_backends = [SearchFilter]
-    search_fields = ['name', 'brand', 'description']
+    lean_serializer_class = ProductLeanSerializer
+    permission_classes = [AllowAny]
+    filter_backends = [FullTextSearchFilter, ProductFacetFilter, ProductRatingFilter, StableOrderingFilter]
+    ordering_fields = PRODUCT_ORDERING_FIELDS
+    pagination_class = ProductSearchPagination
 
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
@@ -185,18 +283,87 @@ class ChatMessageListCreateView(generics.ListCreateAPIView):
 
     def get_queryset(self):
         user = self.request.user
-        other_user_id = self.request.query_params.get('with')
+        since_id, _, other_user_id = chat_request_params(self.request.query_params)
         if other_user_id:
-            return ChatMessage.objects.filter(
+            messages = ChatMessage.objects.filter(
                 (models.Q(sender=user) & models.Q(recipient__id=other_user_id)) |
                 (models.Q(sender__id=other_user_id) & models.Q(recipient=user))
-            ).order_by('timestamp')
+            )
+            # Reconnecting clients pass the last id they have and get only the delta.
+            if since_id:
+                messages = messages.filter(id__gt=since_id)
+            return messages.select_related('sender', 'recipient').order_by('timestamp', 'id')
         return ChatMessage.objects.none()
 
     def perform_create(self, serializer):
         serializer.save(sender=self.request.user)
 
+def chat_request_params(params):
+    """``(since_id, timeout, with)`` from the query; timeout is clamped to 0..MAX_WAIT seconds."""
+    try:
+        since_id = int(params.get('since_id') or 0)
+        timeout = float(params.get('timeout', chat.MAX_WAIT))
+        other_user_id = int(params['with']) if params.get('with') else None
+    except ValueError:
+        raise ValidationError('since_id, with and timeout must be numbers.')
+    if not math.isfinite(timeout):
+        raise ValidationError('timeout must be a finite number of seconds.')
+    if not 0 <= since_id <= chat.MAX_ID or (other_user_id is not None and not 0 < other_user_id <= chat.MAX_ID):
+        raise ValidationError('since_id and with must be valid ids.')
+    return since_id, max(0.0, min(timeout, chat.MAX_WAIT)), other_user_id
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def chat_poll(request):
+    """Long-poll fallback: answers as soon as a message newer than since_id exists."""
+    since_id, timeout, other_user_id = chat_request_params(request.query_params)
+    messages = chat.wait_for_messages(request.user, since_id, timeout, other_user_id)
+    return Response(messages)
+
+def authenticate_stream_request(request):
+    """
+    JWT auth for EventSource clients, which cannot set headers: accepts
+    ?token= too, on this endpoint only. Query strings end up in proxy and
+    server access logs, so clients should pass a short-lived access token
+    (never the refresh token) and log formats should drop the query here.
+    RequestMetricsMiddleware leaves it out of its own log lines.
+    """
+    authenticator = CachedJWTAuthentication()
+    raw_token = request.GET.get('token')
+    if raw_token:
+        validated = authenticator.get_validated_token(raw_token)
+        return authenticator.get_user(validated)
+    result = authenticator.authenticate(request)
+    return result[0] if result else None
+
+async def chat_stream(request):
+    """Server-sent events push channel for chat; resumes from Last-Event-ID or since_id."""
+    try:
+        user = await sync_to_async(authenticate_stream_request)(request)
+    except (InvalidToken, AuthenticationFailed):
+        user = None
+    if user is None or not user.is_active:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    params = request.GET.copy()
+    if request.headers.get('Last-Event-ID'):
+        params['since_id'] = request.headers['Last-Event-ID']
+    try:
+        since_id, _, other_user_id = chat_request_params(params)
+    except ValidationError as e:
+        return JsonResponse({'detail': e.detail}, status=400)
+
+    if isinstance(request, ASGIRequest):
+        stream = chat.event_stream(user, since_id, other_user_id)
+    else:
+        stream = chat.finite_event_stream(user, since_id, other_user_id)
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @api_view(['GET'])
+@catalog_cached
 def productList(request):
     products = Product.objects.all()
     serializer = ProductSerializer(products, many=True)
@@ -206,34 +373,17 @@ def productList(request):
 @permission_classes([IsAuthenticated])
 def create_order(request):
     data = request.data
-    user = request.user
-    items = data.get("items", [])
-
-    # Calculate total price from items
-    total_price = sum(
-        int(item["quantity"]) * float(item["price"])
-        for item in items
-    )
-
-    # Create Order
-    order = Order.objects.create(
-        user=user,
-        total_price=total_price,
-        payment_method=data.get("payment_method", "COD"),
-        payment_status="pending",
-        order_status="pending"
-    )
-
-    # Create OrderItem for each cart item
-    for item in items:
-        OrderItem.objects.create(
-            order=order,
-            product_id=item["product"],
-            quantity=item["quantity"],
-            price=item["price"]
+    try:
+        order = checkout.place_order(
+            request.user,
+            data.get("items", []),
+            payment_method=data.get("payment_method", "COD"),
         )
+    except checkout.CheckoutError as e:
+        return Response({"error": str(e)}, status=400)
 
-    serializer = OrderSerializer(order)
+    order = Order.objects.with_details().get(pk=order.pk)
+    serializer = OrderSerializer(order, context={'request': request})
     return Response(serializer.data)
 
 from rest_framework import generics
@@ -241,17 +391,27 @@ from .models import OrderItem, CartItem, ShippingAddress
 from .serializers import OrderItemSerializer, CartItemSerializer, ShippingAddressSerializer
 from rest_framework.permissions import IsAuthenticated
 
-class OrderItemListCreateView(generics.ListCreateAPIView):
+class OrderItemListCreateView(LeanListMixin, generics.ListCreateAPIView):
     queryset = OrderItem.objects.all()
     serializer_class = OrderItemSerializer
+    lean_serializer_class = OrderItemLeanSerializer
     permission_classes = [IsAuthenticated]
 
-class CartItemListCreateView(generics.ListCreateAPIView):
+class CartItemListCreateView(SparseFieldsetViewMixin, generics.ListCreateAPIView):
     serializer_class = CartItemSerializer
     permission_classes = [IsAuthenticated]
     def get_queryset(self):
         return CartItem.objects.filter(user=self.request.user)
 
+    def perform_create(self, serializer):
+        product = serializer.validated_data['product']
+        try:
+            with transaction.atomic():
+                add_items(self.request.user, {product.id: serializer.validated_data.get('quantity', 1)})
+                serializer.instance = CartItem.objects.get(user=self.request.user, product=product)
+        except CartError as e:
+            raise ValidationError({'quantity': str(e)})
+
 class ShippingAddressListCreateView(generics.ListCreateAPIView):
     serializer_class = ShippingAddressSerializer
     permission_classes = [IsAuthenticated]
@@ -271,6 +431,7 @@ class ReviewListCreateView(generics.ListCreateAPIView):
 class ProductReviewListCreateView(generics.ListCreateAPIView):
     serializer_class = ReviewSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = ReviewCursorPagination
 
     def get_queryset(self):
         return Review.objects.filter(product_id=self.kwargs["pk"])
@@ -281,9 +442,10 @@ class ProductReviewListCreateView(generics.ListCreateAPIView):
             user=self.request.user
         )
 
-class UserListView(generics.ListAPIView):
+class UserListView(LeanListMixin, generics.ListAPIView):
     queryset = get_user_model().objects.all()
     serializer_class = UserSerializer
+    lean_serializer_class = UserLeanSerializer
     permission_classes = [IsAuthenticated]
 
 from rest_framework.decorators import api_view, permission_classes
@@ -301,26 +463,36 @@ def cart_view(request):
     user = request.user
 
     if request.method == 'GET':
-        cart_items = CartItem.objects.filter(user=user)
-        serializer = CartItemSerializer(cart_items, many=True)
+        fieldset = Fieldset.from_request(request, CartItemSerializer)
+        cart_items = fieldset.prune(CartItem.objects.filter(user=user))
+        serializer = CartItemSerializer(cart_items, many=True, context={'request': request, 'fieldset': fieldset})
         return Response(serializer.data)
 
     elif request.method == 'POST':
-        product_id = request.data.get('product_id')
-        quantity = request.data.get('quantity', 1)
-
+        try:
+            product_id = int(request.data.get('product_id'))
+        except (TypeError, ValueError):
+            product_id = 0
+        if not 1 <= product_id <= checkout.MAX_PRODUCT_ID:
+            return Response({'error': 'Product not found'}, status=404)
         try:
             product = Product.objects.get(id=product_id)
         except Product.DoesNotExist:
             return Response({'error': 'Product not found'}, status=404)
 
-        # Check if already in cart
-        cart_item, created = CartItem.objects.get_or_create(user=user, product=product)
-        if not created:
-            cart_item.quantity += int(quantity)
-        else:
-            cart_item.quantity = int(quantity)
-        cart_item.save()
+        try:
+            quantity = int(request.data.get('quantity', 1))
+        except (TypeError, ValueError):
+            quantity = 0
+        if not 1 <= quantity <= checkout.MAX_QUANTITY:
+            return Response({'error': 'Invalid quantity'}, status=400)
+
+        try:
+            with transaction.atomic():
+                add_items(user, {product.id: quantity})
+                cart_item = CartItem.objects.get(user=user, product=product)
+        except CartError as e:
+            return Response({'error': str(e)}, status=400)
 
         serializer = CartItemSerializer(cart_item)
         return Response(serializer.data, status=201)
@@ -361,35 +533,20 @@ def add_shipping_address(request):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def place_order(request):
-    user = request.user
-    items = request.data.get('items', [])
-    payment_method = request.data.get('payment_method', 'COD')
-
-    total = sum([item['quantity'] * item['price'] for item in items])
-
-    order = Order.objects.create(
-        user=user,
-        total_price=total,
-        payment_method=payment_method,
-        payment_status='pending',
-        order_status='pending'
-    )
-
-    for item in items:
-        OrderItem.objects.create(
-            order=order,
-            product_id=item['product'],
-            quantity=item['quantity'],
-            price=item['price']
+    try:
+        order = checkout.place_order(
+            request.user,
+            request.data.get('items', []),
+            payment_method=request.data.get('payment_method', 'COD'),
         )
+    except checkout.CheckoutError as e:
+        return Response({'error': str(e)}, status=400)
 
-    # Optionally clear cart
-    CartItem.objects.filter(user=user).delete()
-
-    serializer = OrderSerializer(order)
+    order = Order.objects.with_details().get(pk=order.pk)
+    serializer = OrderSerializer(order, context={'request': request})
     return Response(serializer.data, status=201)
 
-class CartItemViewSet(viewsets.ModelViewSet):
+class CartItemViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
     queryset = CartItem.objects.all()
     serializer_class = CartItemSerializer
     permission_classes = [IsAuthenticated]
@@ -401,16 +558,12 @@ class CartItemViewSet(viewsets.ModelViewSet):
         product = serializer.validated_data['product']
         quantity = serializer.validated_data.get('quantity', 1)
 
-        # Check if item already in cart
-        cart_item, created = CartItem.objects.get_or_create(
-            user=self.request.user,
-            product=product,
-            defaults={'quantity': quantity}
-        )
-        if not created:
-            cart_item.quantity += quantity
-            cart_item.save()
-        return cart_item
+        try:
+            with transaction.atomic():
+                add_items(self.request.user, {product.id: quantity})
+                return CartItem.objects.get(user=self.request.user, product=product)
+        except CartError as e:
+            raise ValidationError({'quantity': str(e)})
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -419,6 +572,20 @@ class CartItemViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(cart_item)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """Cart lines with product data, line totals, stock and the grand total."""
+        return Response(cart_summary(request.user, request))
+
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """Apply many add/set/remove operations at once and return the new summary."""
+        try:
+            apply_operations(request.user, request.data.get('operations'))
+        except CartError as e:
+            return Response({'error': str(e)}, status=400)
+        return Response(cart_summary(request.user, request))
+
     @action(detail=False, methods=['delete'])
     def clear(self, request):
         CartItem.objects.filter(user=request.user).delete()
@@ -508,10 +675,32 @@ from rest_framework import viewsets
 from .models import Product
 from .serializers import ProductSerializer
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(SparseFieldsetViewMixin, LeanListMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
+    lean_serializer_class = ProductLeanSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    filter_backends = [FullTextSearchFilter, ProductFacetFilter, ProductRatingFilter, StableOrderingFilter]
+    ordering_fields = PRODUCT_ORDERING_FIELDS
+
+    def list(self, request, *args, **kwargs):
+        return cached_catalog_response(request, lambda: super(ProductViewSet, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return cached_catalog_response(
+            request, lambda: super(ProductViewSet, self).retrieve(request, *args, **kwargs),
+            get_product_version(kwargs['pk']),
+        )
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """Facet counts for the same filters ``list`` accepts."""
+        def build_response():
+            queryset = self.get_queryset()
+            for backend in (FullTextSearchFilter, ProductRatingFilter):
+                queryset = backend().filter_queryset(request, queryset, self)
+            return Response(facet_counts(queryset, catalog_criteria(request)))
+        return cached_catalog_response(request, build_response)
 
     def perform_create(self, serializer):
         user = self.request.user
@@ -533,26 +722,22 @@ class UserViewSet(viewsets.ModelViewSet):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def dashboard_stats(request):
-    total_orders = Order.objects.count()
-    total_revenue = Order.objects.aggregate(total=Sum('total_price'))['total'] or 0
+    totals = DailySales.objects.aggregate(orders=Sum('order_count'), revenue=Sum('revenue'))
+    limit = limit_param(request, 10, maximum=100)
 
     # Most selling products
     product_sales = (
-        OrderItem.objects.values(
-            'product__id',
-            'product__name',
-            'product__image'
-        )
-        .annotate(quantity_sold=Sum('quantity'))
+        ProductSales.objects.filter(quantity_sold__gt=0)
         .order_by('-quantity_sold')
+        .values('product__id', 'product__name', 'product__image', 'quantity_sold')[:limit]
     )
 
     most_selling_products = list(product_sales)
     best_product = most_selling_products[0] if most_selling_products else None
 
     return Response({
-        "total_orders": total_orders,
-        "total_revenue": total_revenue,
+        "total_orders": totals['orders'] or 0,
+        "total_revenue": totals['revenue'] or 0,
         "best_product": best_product,
         "most_selling_products": most_selling_products,
     })
@@ -561,8 +746,9 @@ def dashboard_stats(request):
 @permission_classes([IsAuthenticated])
 def list_orders(request):
     user = request.user
-    orders = Order.objects.filter(user=user).order_by('-created_at')
-    serializer = OrderSerializer(orders, many=True)
+    fieldset = Fieldset.from_request(request, OrderSerializer)
+    orders = fieldset.prune(Order.objects.with_details()).filter(user=user).order_by('-created_at', '-id')
+    serializer = OrderSerializer(orders, many=True, context={'fieldset': fieldset})
     return Response(serializer.data)
 
 from rest_framework import serializers
@@ -575,25 +761,22 @@ class MostSellingProductsView(generics.ListAPIView):
     serializer_class = MostSellingProductSerializer
 
     def get_queryset(self):
+        limit = limit_param(self.request, 10, maximum=100)
         qs = (
-            OrderItem.objects
-            .values("product")
-            .annotate(quantity_sold=Sum("quantity"))
-            .order_by("-quantity_sold")
+            ProductSales.objects
+            .filter(quantity_sold__gt=0)
+            .select_related("product")
+            .order_by("-quantity_sold")[:limit]
         )
-        # Attach product name and image to each result
-        product_ids = [item["product"] for item in qs]
-        products = Product.objects.in_bulk(product_ids)
-        result = []
-        for item in qs:
-            product = products.get(item["product"])
-            result.append({
-                "product": item["product"],
-                "name": product.name if product else "",
-                "image": product.image.url if product and product.image else "",
-                "quantity_sold": item["quantity_sold"],
-            })
-        return result
+        return [
+            {
+                "product": row.product_id,
+                "name": row.product.name,
+                "image": row.product.image.url if row.product.image else "",
+                "quantity_sold": row.quantity_sold,
+            }
+            for row in qs
+        ]
 
 def get_order_status_message(order, status):
     if status == "pending":
@@ -612,10 +795,11 @@ def get_order_status_message(order, status):
 @api_view(['PATCH'])
 @permission_classes([IsAuthenticated])
 def update_order_status(request, pk):
-    order = Order.objects.get(pk=pk)
     new_status = request.data.get('order_status')
-    order.order_status = new_status
-    order.save()
+    with transaction.atomic():
+        order = Order.objects.select_for_update().get(pk=pk)
+        order.order_status = new_status
+        order.save()  # shop.signals updates the sales rollups
     message = get_order_status_message(order, new_status)
     # Create notification with order and status
     Notification.objects.create(
@@ -629,12 +813,35 @@ def update_order_status(request, pk):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def user_notifications(request):
-    notifications = Notification.objects.filter(user=request.user).order_by('-created_at')
-    data = [
-        {"message": n.message, "created_at": n.created_at, "is_read": n.is_read}
-        for n in notifications
-    ]
-    return Response(data)
+    try:
+        after = request.query_params.get('after')
+        after = int(after) if after else None
+    except ValueError:
+        return Response({'error': 'after must be an integer'}, status=400)
+    limit = limit_param(request, notifications.FEED_LIMIT, maximum=200)
+    return conditional_response(
+        request,
+        lambda: Response(notifications.feed(request.user, after=after, limit=limit)),
+        [notifications.feed_version(request.user)],
+    )
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def unread_notification_count(request):
+    return Response({'unread': notifications.unread_count(request.user)})
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def mark_notifications_read(request):
+    ids = request.data.get('ids')
+    up_to = request.data.get('up_to')
+    try:
+        ids = [int(i) for i in ids] if ids is not None else None
+        up_to = int(up_to) if up_to is not None else None
+    except (TypeError, ValueError):
+        return Response({'error': 'ids must be a list of integers and up_to an integer'}, status=400)
+    updated = notifications.mark_read(request.user, ids=ids, up_to=up_to)
+    return Response({'updated': updated, 'unread': notifications.unread_count(request.user)})
 
 from django.contrib.auth import get_user_model
 